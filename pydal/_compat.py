@@ -19,6 +19,11 @@ if PY2:
     string_types = (str, unicode)
     basestring = basestring
     xrange = xrange
+    try:
+        buffer_types = (buffer, memoryview)
+    except NameError:
+        # python 2.6
+        buffer_types = (buffer,)
 
     def to_unicode(obj):
         if isinstance(obj, str):
@@ -49,6 +54,7 @@ else:
     string_types = (str,)
     basestring = str
     xrange = range
+    buffer_types = (memoryview,)
 
     def to_unicode(obj):
         if isinstance(obj, bytes):
@@ -13,3 +13,8 @@ from .contrib import portalocker
 #    import portalocker
 #except ImportError:
 #    from .contrib import portalocker
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
@@ -10,22 +10,26 @@ import time
 import base64
 import types
 import json
+from itertools import chain
 
 from .._compat import PY2, pjoin, exists, pickle, hashlib_md5, iterkeys, \
     iteritems, with_metaclass, to_unicode, integer_types, basestring, \
     string_types
 from .._globals import IDENTITY
-from .._load import portalocker
+from .._load import portalocker, OrderedDict, numpy
 from ..connection import ConnectionPool
 from ..objects import Expression, Field, Query, Table, Row, FieldVirtual, \
-    FieldMethod, LazyReferenceGetter, LazySet, VirtualCommand, Rows, IterRows
+    FieldMethod, LazyReferenceGetter, LazySet, VirtualCommand, Rows, \
+    ColumnarRows, IterRows, LazyRow, LazyRowAttribute, RowIndex, \
+    RowsSerializer, PackedRows
 from ..helpers.regex import REGEX_NO_GREEDY_ENTITY_NAME, REGEX_TYPE, \
-    REGEX_SELECT_AS_PARSER
+    REGEX_SELECT_AS_PARSER, REGEX_BIND_MARKER
 from ..helpers.methods import xorify, use_common_filters, bar_encode, \
     bar_decode_integer, bar_decode_string
 from ..helpers.classes import SQLCustomType, SQLALL, Reference, \
     RecordUpdater, RecordDeleter
 from ..helpers.serializers import serializers
+from ..helpers.cache import TableVersions, RowCounters
 
 long = integer_types[-1]
 
@@ -33,16 +37,21 @@ TIMINGSSIZE = 100
 CALLABLETYPES = (types.LambdaType, types.FunctionType,
                  types.BuiltinFunctionType,
                  types.MethodType, types.BuiltinMethodType)
+# the (faster) C parsers of ISO 8601 strings, python >= 3.7
+FROMISOFORMAT = hasattr(datetime.datetime, 'fromisoformat')
 SELECT_ARGS = set(
     ('orderby', 'groupby', 'limitby', 'required', 'cache', 'left', 'distinct',
      'having', 'join', 'for_update', 'processor', 'cacheable',
-     'orderby_on_limitby'))
+     'orderby_on_limitby', 'rows_class'))
+BIND_MARKER = '\x00%d\x00'
+BIND_PLACEHOLDERS = {'qmark': '?', 'format': '%s', 'pyformat': '%s'}
 
 
 class AdapterMeta(type):
     """Metaclass to support manipulation of adapter classes.
 
-    At the moment is used to intercept `entity_quoting` argument passed to DAL.
+    At the moment is used to intercept `entity_quoting` and `param_style`
+    arguments passed to DAL.
     """
 
     def __call__(cls, *args, **kwargs):
@@ -54,7 +63,20 @@ class AdapterMeta(type):
         if 'entity_quoting' in kwargs:
             del kwargs['entity_quoting']
 
+        param_style = kwargs.get('param_style', 'inline')
+        if 'param_style' in kwargs:
+            del kwargs['param_style']
+        if param_style not in ('inline', 'bind'):
+            raise SyntaxError('invalid param_style: %s' % param_style)
+
         obj = super(AdapterMeta, cls).__call__(*args, **kwargs)
+        if param_style == 'bind' and not obj.can_bind_params:
+            raise SyntaxError(
+                "param_style='bind' not supported by %s" % cls.__name__)
+        obj.param_style = param_style
+        table_versions = kwargs.get('adapter_args', {}).get('table_versions')
+        if table_versions is not None:
+            obj.table_versions = table_versions
         if not entity_quoting:
             quot = obj.QUOTE_TEMPLATE = '%s'
             regex_ent = r'(\w+)'
@@ -77,6 +99,61 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
     support_distributed_transaction = False
     uploads_in_blob = False
     can_select_for_update = True
+    can_bind_params = True
+    param_style = 'inline'
+    select_cache_size = 100
+    parser_cache_size = 100
+    #: rows fetched at once by `iterselect`
+    fetch_size = 1000
+    #: max ids in the belongs of `Rows.prefetch`
+    belongs_size = 1000
+    #: field types whose values the driver returns already parsed
+    native_types = frozenset()
+    #: native types still parsed on python 2, where they are returned as
+    #: long while the drivers return int
+    long_types = frozenset(('id', 'integer', 'bigint')) if PY2 \
+        else frozenset()
+    #: operators rewriting their literals before binding them (e.g. LIKE
+    #: escapes them), whose selects are not kept in the compiled select cache
+    rewriting_ops = frozenset(('LIKE', 'ILIKE', 'STARTSWITH', 'ENDSWITH',
+                               'CONTAINS'))
+    #: write counters of the tables, part of the keys of cached selects
+    table_versions = TableVersions()
+    _written = None
+    _unversioned = False
+    #: record counters of the tables, used by `Set.count(approximate=True)`
+    row_counters = RowCounters()
+    #: seconds after which the record counters are estimated again
+    row_counters_expire = 300
+    #: numpy dtypes of the field types, the others are stored as objects
+    numpy_types = {
+        'id': 'int64',
+        'integer': 'int64',
+        'bigint': 'int64',
+        'reference': 'int64',
+        'float': 'float64',
+        'double': 'float64',
+        'boolean': 'bool',
+        'date': 'datetime64[D]',
+        'datetime': 'datetime64[us]',
+        }
+    #: field types of the (parsed) values of the columns of `Rows.as_numpy`
+    #: that are not table fields, for `numpy_types`
+    numpy_value_types = {
+        bool: 'boolean',
+        int: 'bigint',
+        float: 'double',
+        datetime.date: 'date',
+        datetime.datetime: 'datetime',
+        }
+    if PY2:
+        numpy_value_types[long] = 'bigint'
+    _bind_values = None
+    _bind_trace = None
+    _bind_owner = None
+    _select_shapes = None
+    _select_templates = None
+    _row_parsers = None
     dbpath = None
     folder = None
     connector = lambda *args, **kwargs: None  # __init__ should override this
@@ -727,14 +804,16 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         return 'INSERT INTO %s DEFAULT VALUES;' % (table.sqlsafe)
 
     def insert(self, table, fields):
-        query = self._insert(table,fields)
+        self.touch_tables([table._tablename])
+        query, params = self.build_statement(self._insert, table, fields)
         try:
-            self.execute(query)
+            self.execute_bound(query, params)
         except Exception:
             e = sys.exc_info()[1]
             if hasattr(table,'_on_insert_error'):
                 return table._on_insert_error(table,fields,e)
             raise e
+        self.row_counters.add(self.table_keys([table._tablename])[0], 1)
         if hasattr(table, '_primarykey'):
             mydict = dict([(k[0].name, k[1]) for k in fields if k[0].name in table._primarykey])
             if mydict != {}:
@@ -784,10 +863,11 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape * 2)
+                if isinstance(second, basestring):
+                    second = second.replace(escape, escape * 2)
+            second = self.expand(second, 'string')
         return "(%s LIKE %s ESCAPE '%s')" % (self.expand(first),
                 second, escape)
 
@@ -796,10 +876,13 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string').lower()
+            if isinstance(second, basestring):
+                second = second.lower()
+                if escape is None:
+                    second = second.replace('\\', '\\\\')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape*2)
+            second = self.expand(second, 'string')
         return "(LOWER(%s) LIKE %s ESCAPE '%s')" % (self.expand(first),
                 second, escape)
 
@@ -939,18 +1022,26 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
             second = expression.second
             op = expression.op
             optional_args = expression.optional_args or {}
-            if second is not None:
-                rv = op(first, second, **optional_args)
-            elif first is not None:
-                rv = op(first, **optional_args)
-            elif isinstance(op, str):
-                if op.endswith(';'):
-                    op = op[:-1]
-                rv = '(%s)' % op
-            else:
-                rv = op()
+            owner, self._bind_owner = self._bind_owner, expression
+            try:
+                if second is not None:
+                    rv = op(first, second, **optional_args)
+                elif first is not None:
+                    rv = op(first, **optional_args)
+                elif isinstance(op, str):
+                    if op.endswith(';'):
+                        op = op[:-1]
+                    rv = '(%s)' % op
+                else:
+                    rv = op()
+            finally:
+                self._bind_owner = owner
         elif field_type:
-            rv = self.represent(expression, field_type)
+            if self._bind_values is not None and \
+                    self.can_bind(expression, field_type):
+                rv = self.bind(expression, field_type)
+            else:
+                rv = self.represent(expression, field_type)
         elif isinstance(expression, (list, tuple)):
             rv = ','.join(self.represent(item, field_type)
                           for item in expression)
@@ -988,6 +1079,10 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         return ['TRUNCATE TABLE %s %s;' % (table.sqlsafe, mode or '')]
 
     def truncate(self, table, mode= ' '):
+        tablenames = [table._tablename] + \
+            [field.tablename for field in table._referenced_by]
+        self.touch_tables(tablenames)
+        self.row_counters.forget(self.table_keys(tablenames))
         # Prepare functions "write_to_logfile" and "close_logfile"
         try:
             queries = table._db._adapter._truncate(table, mode)
@@ -1012,9 +1107,11 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         return 'UPDATE %s SET %s%s;' % (tablename, sql_v, sql_w)
 
     def update(self, tablename, query, fields):
-        sql = self._update(tablename, query, fields)
+        self.touch_tables([tablename])
+        sql, params = self.build_statement(
+            self._update, tablename, query, fields)
         try:
-            self.execute(sql)
+            self.execute_bound(sql, params)
         except Exception:
             e = sys.exc_info()[1]
             table = self.db[tablename]
@@ -1037,12 +1134,23 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         return 'DELETE FROM %s%s;' % (tablename, sql_w)
 
     def delete(self, tablename, query):
-        sql = self._delete(tablename, query)
-        self.execute(sql)
+        # the references may cascade
+        self.touch_tables([tablename] + [field.tablename for field in
+                                         self.db[tablename]._referenced_by])
+        sql, params = self.build_statement(self._delete, tablename, query)
+        self.execute_bound(sql, params)
         try:
             counter = self.cursor.rowcount
         except:
             counter =  None
+        if counter is None or counter < 0:
+            self.row_counters.forget(self.table_keys([tablename]))
+        elif counter:
+            self.row_counters.add(self.table_keys([tablename])[0], -counter)
+            # the references may cascade
+            self.row_counters.forget(self.table_keys(
+                [field.tablename for field in
+                 self.db[tablename]._referenced_by]))
         return counter
 
     def get_table(self, query):
@@ -1093,7 +1201,10 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
             raise SyntaxError('Set: no tables selected')
         def colexpand(field):
             return self.expand(field, colnames=True)
+        # colnames are used as keys by Row, so literals are always inlined
+        bind_values, self._bind_values = self._bind_values, None
         self._colnames = list(map(colexpand, fields))
+        self._bind_values = bind_values
         def geoexpand(field):
             if isinstance(field.type,str) and field.type.startswith('geo') and isinstance(field, Field):
                 field = field.st_astext()
@@ -1235,33 +1346,67 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
     def _fetchone(self):
         return self.cursor.fetchone()
 
-    def _select_aux(self, sql, fields, attributes):
+    def _fetchmany(self, size, cursor=None):
+        return (cursor or self.cursor).fetchmany(size)
+
+    def iter_cursor(self, sql, params=None):
+        """
+        Executes the select of an `IterRows`, returns the cursor to fetch its
+        rows from
+        """
+        self.execute_bound(sql, params)
+        return self.cursor
+
+    def close_iter_cursor(self, cursor):
+        """
+        Releases a cursor returned by `iter_cursor` (unless it is the one of
+        the adapter)
+        """
+        if cursor is not self.cursor:
+            cursor.close()
+
+    def _select_aux(self, sql, fields, attributes, params=None,
+                    tablenames=()):
         args_get = attributes.get
         cache = args_get('cache',None)
         if not cache:
-            self.execute(sql)
+            self.execute_bound(sql, params)
             rows = self._fetchall()
         else:
             if isinstance(cache, dict):
                 cache_model = cache['model']
                 time_expire = cache['expiration']
                 key = cache.get('key')
-                if not key:
-                    key = self.uri + '/' + sql + '/rows'
-                    key = hashlib_md5(key).hexdigest()
             else:
                 (cache_model, time_expire) = cache
+                key = None
+            if not key:
                 key = self.uri + '/' + sql + '/rows'
+                if params:
+                    key += '/' + repr(params)
+                key = self.versioned_key(key, tablenames)
                 key = hashlib_md5(key).hexdigest()
             def _select_aux2():
-                self.execute(sql)
+                self.execute_bound(sql, params)
                 return self._fetchall()
             rows = cache_model(key,_select_aux2,time_expire)
+        return self._parse_select(rows, fields, attributes)
+
+    def _parse_select(self, rows, fields, attributes, rows_class=None):
+        args_get = attributes.get
         if isinstance(rows,tuple):
             rows = list(rows)
         limitby = args_get('limitby', None) or (0,)
         rows = self.rowslice(rows,limitby[0],None)
-        processor = args_get('processor', self.parse)
+        rows_class = args_get('rows_class', rows_class)
+        if rows_class == 'columnar':
+            processor = args_get('processor', self.parse_columnar)
+        elif rows_class == 'compact':
+            processor = args_get('processor', self.parse_compact)
+        elif rows_class is None:
+            processor = args_get('processor', self.parse)
+        else:
+            raise SyntaxError('invalid rows_class: %s' % rows_class)
         cacheable = args_get('cacheable',False)
         return processor(rows,fields,self._colnames,cacheable=cacheable)
 
@@ -1269,25 +1414,35 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         """
         Always returns a Rows object, possibly empty.
         """
-        sql = self._select(query, fields, attributes)
+        sql, params = self.build_select(query, fields, attributes)
         cache = attributes.get('cache', None)
+        if cache:
+            tablenames = self.select_tables(query, fields, attributes)
         if cache and attributes.get('cacheable',False):
             del attributes['cache']
             (cache_model, time_expire) = cache
-            key = self.uri + '/' + sql
+            key = self.uri + '/' + sql + '/packed'
+            if params:
+                key += '/' + repr(params)
+            key = self.versioned_key(key, tablenames)
             key = hashlib_md5(key).hexdigest()
-            args = (sql,fields,attributes)
-            return cache_model(
-                key,
-                lambda self=self,args=args:self._select_aux(*args),
-                time_expire)
+            def packed_select():
+                self.execute_bound(sql, params)
+                return PackedRows(self._fetchall(), self._colnames)
+            packed = cache_model(key, packed_select, time_expire)
+            return self._parse_select(packed.rows(), fields, attributes)
+        elif cache:
+            return self._select_aux(sql, fields, attributes, params,
+                                    tablenames)
         else:
-            return self._select_aux(sql,fields,attributes)
+            return self._select_aux(sql,fields,attributes,params)
 
     def iterselect(self, query, fields, attributes):
-        sql = self._select(query, fields, attributes)
+        fetch_size = attributes.pop('fetch_size', None)
+        sql, params = self.build_select(query, fields, attributes)
         cacheable = attributes.get('cacheable', False)
-        return self.iterparse(sql, fields, self._colnames, cacheable=cacheable)
+        return self.iterparse(sql, fields, self._colnames, cacheable=cacheable,
+                              params=params, fetch_size=fetch_size)
 
     def _count(self, query, distinct=None):
         tablenames = self.tables(query)
@@ -1307,9 +1462,55 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         return 'SELECT count(*) FROM %s%s;' % (sql_t, sql_w)
 
     def count(self, query, distinct=None):
-        self.execute(self._count(query, distinct))
+        sql, params = self.build_statement(self._count, query, distinct)
+        self.execute_bound(sql, params)
         return self.cursor.fetchone()[0]
 
+    def whole_table(self, query):
+        """
+        Returns the name of the table whose records are all selected by
+        `query` (as by `db(table)`), None for any other query
+        """
+        if not isinstance(query, Query) or not isinstance(query.first, Field):
+            return None
+        table = query.first.table
+        whole = self.id_query(table)
+        if query.op != whole.op or query.first is not whole.first or \
+                query.second != whole.second:
+            return None
+        # common filters return a new query when they apply
+        if use_common_filters(query) and \
+                self.common_filter(query, [table._tablename]) is not query:
+            return None
+        return table._tablename
+
+    def estimate_count(self, sqlsafe):
+        """
+        Returns the number of records of the table `sqlsafe` as estimated
+        by the database, None when not available
+        """
+        return None
+
+    def approximate_count(self, query):
+        """
+        Counts the records of `query` with `count`, unless it selects a
+        whole table: then returns the counter of its records, set from
+        `estimate_count` (or `count`) when missing or older than
+        `row_counters_expire` seconds and updated by `insert` and `delete`
+        """
+        tablename = self.whole_table(query)
+        if tablename is None:
+            return self.count(query)
+        table = self.db[tablename]
+        key = self.table_keys([tablename])[0]
+        count = self.row_counters.get(key, self.row_counters_expire)
+        if count is None:
+            count = self.estimate_count(table._ot or table.sqlsafe)
+            if count is None:
+                count = self.count(query)
+            self.row_counters.set(key, count)
+        return count
+
     def tables(self, *queries):
         tables = set()
         for query in queries:
@@ -1322,13 +1523,81 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
                     tables = tables.union(self.tables(query.second))
         return list(tables)
 
+    def select_tables(self, query, fields, attributes):
+        """
+        Returns the names of the tables read by a select
+        """
+        expressions = [query] + list(fields)
+        tablenames = []
+        for key in ('join', 'left', 'orderby', 'groupby', 'having'):
+            value = attributes.get(key)
+            for item in value if isinstance(value, (list, tuple)) \
+                    else [value]:
+                if isinstance(item, Table):
+                    tablenames.append(item._tablename)
+                elif item is not None:
+                    expressions.append(item)
+        return list(set(tablenames + self.tables(*expressions)))
+
+    def table_keys(self, tablenames):
+        # the keys of the versions of the tables (aliases use the original)
+        db = self.db
+        keys = set()
+        for tablename in tablenames:
+            table = db[tablename]
+            keys.add('%s/%s' % (db._uri_hash, table._ot or table.sqlsafe))
+        return sorted(keys)
+
+    def touch_tables(self, tablenames):
+        """
+        Marks `tablenames` as written, their versions are bumped before the
+        next cached select or count and at the end of the transaction, and
+        their records are dropped from the identity map
+        """
+        if self._written is None:
+            self._written = set()
+        self._written.update(self.table_keys(tablenames))
+        self._unversioned = True
+        if self.db._identity_map is not None:
+            self.db._identity_map.forget(tablenames)
+
+    def versioned_key(self, key, tablenames):
+        """
+        Returns the cache `key` of a select or count with the versions of
+        the `tablenames` it reads, so that it changes when they are written
+        """
+        if self._unversioned:
+            self.table_versions.bump(self._written)
+            self._unversioned = False
+        keys = self.table_keys(tablenames)
+        versions = self.table_versions.get(keys)
+        return key + '/' + ','.join('%s' % version for version in versions)
+
+    def end_transaction(self):
+        # the values cached during the transaction may not be the committed
+        # ones (or what the others read before the commit)
+        if self._written:
+            self.table_versions.bump(self._written)
+        self._written = None
+        self._unversioned = False
+
     def commit(self):
         if self.connection:
-            return self.connection.commit()
+            try:
+                return self.connection.commit()
+            finally:
+                self.end_transaction()
 
     def rollback(self):
+        if self.db._identity_map is not None:
+            self.db._identity_map.clear()
+        if self._written:
+            self.row_counters.forget(self._written)
         if self.connection:
-            return self.connection.rollback()
+            try:
+                return self.connection.rollback()
+            finally:
+                self.end_transaction()
 
     def close_connection(self):
         if self.connection:
@@ -1376,6 +1645,253 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
     def execute(self, *a, **b):
         return self.log_execute(*a, **b)
 
+    def execute_bound(self, sql, params=None):
+        if params:
+            return self.execute(sql, params)
+        return self.execute(sql)
+
+    def build_statement(self, builder, *args):
+        """
+        Runs a statement builder (`_select`, `_insert`, `_update`, `_delete`
+        or `_count`) and returns a `(sql, params)` tuple.
+
+        With `param_style='bind'` the literals are replaced by driver
+        placeholders and returned in `params`, otherwise they are inlined
+        and `params` is None.
+        """
+        if self.param_style != 'bind':
+            return builder(*args), None
+        previous, self._bind_values = self._bind_values, []
+        try:
+            sql = builder(*args)
+            values = self._bind_values
+        finally:
+            self._bind_values = previous
+        return self.bind_placeholders(sql, values)
+
+    def bind_placeholders(self, sql, values):
+        """
+        Replaces the markers produced by `bind()` with driver placeholders,
+        collecting the values in the order they appear in `sql`
+        """
+        if not values:
+            return sql, None
+        placeholder = BIND_PLACEHOLDERS.get(
+            getattr(self.driver, 'paramstyle', None))
+        if placeholder is None:
+            raise RuntimeError(
+                "driver %s does not support bound parameters" %
+                self.driver_name)
+        if placeholder == '%s':
+            sql = sql.replace('%', '%%')
+        params = []
+        def replace(m):
+            params.append(values[int(m.group(1))])
+            return placeholder
+        sql = REGEX_BIND_MARKER.sub(replace, sql)
+        return sql, tuple(params)
+
+    def build_select(self, query, fields, attributes):
+        """
+        Same as `build_statement(self._select, query, fields, attributes)`.
+
+        With `param_style='bind'` the compiled statements are also kept in a
+        LRU cache (of `select_cache_size` entries) keyed by the structure of
+        the query, the fields and the attributes: selects that only differ
+        in the values of their literals reuse the cached SQL and colnames,
+        and just extract the new parameters.
+        """
+        nodes, leaves = [], []
+        if self.param_style != 'bind' or not self.select_cache_size:
+            shape = None
+        else:
+            shape = self.select_shape(query, fields, attributes, nodes, leaves)
+        if shape is None:
+            return self.build_statement(self._select, query, fields, attributes)
+        if self._select_shapes is None:
+            self._select_shapes = OrderedDict()
+            self._select_templates = OrderedDict()
+        shapes, templates = self._select_shapes, self._select_templates
+        inlined = shapes.pop(shape, False)
+        if inlined is not False:
+            shapes[shape] = inlined
+            if inlined is None:
+                return self.build_statement(
+                    self._select, query, fields, attributes)
+            key = (shape, inlined, self.select_leaves(nodes, inlined))
+            template = templates.pop(key, None)
+            if template is not None:
+                templates[key] = template
+                sql, recipe, colnames = template
+                self._colnames = list(colnames)
+                return sql, self.select_params(nodes, recipe)
+        # compile the statement tracing where each bound value comes from
+        previous = self._bind_values, self._bind_trace, self._bind_owner
+        self._bind_values, self._bind_trace, self._bind_owner = [], [], None
+        try:
+            sql = self._select(query, fields, attributes)
+            values, trace = self._bind_values, self._bind_trace
+        finally:
+            self._bind_values, self._bind_trace, self._bind_owner = previous
+        order = [int(i) for i in REGEX_BIND_MARKER.findall(sql)]
+        sql, params = self.bind_placeholders(sql, values)
+        recipe = self.select_recipe(nodes, trace, order)
+        if recipe is None:
+            inlined = None
+        else:
+            bound = set(position for position, fieldtype in recipe)
+            inlined = tuple(p for p in leaves if not p in bound)
+            key = (shape, inlined, self.select_leaves(nodes, inlined))
+            templates[key] = (sql, recipe, list(self._colnames))
+            while len(templates) > self.select_cache_size:
+                templates.popitem(last=False)
+        shapes[shape] = inlined
+        while len(shapes) > self.select_cache_size:
+            shapes.popitem(last=False)
+        return sql, params
+
+    def select_shape(self, query, fields, attributes, nodes, leaves):
+        """
+        Returns a hashable fingerprint of a select where the literals of
+        the query tree are replaced by their type. The expressions met are
+        appended to `nodes` and the positions of the literals, as
+        `(node index, 'first' or 'second', item index or None)`, to
+        `leaves`. Returns None if the select can't be cached.
+        """
+        tables = {}
+        uncacheable = []
+        def shape(obj):
+            if isinstance(obj, Field):
+                table = obj.table
+                tables[id(table)] = table
+                return ('F', obj.tablename, obj.name, obj.type, obj._rname,
+                        table._rname, table._ot)
+            elif isinstance(obj, (Expression, Query)):
+                index = len(nodes)
+                nodes.append(obj)
+                op = obj.op
+                if not isinstance(op, str):
+                    # the literals are only found by identity in the trace,
+                    # a rewrite may return the same object
+                    if getattr(op, '__self__', None) is not self or \
+                            getattr(op, '__name__', None) in self.rewriting_ops:
+                        uncacheable.append(op)
+                    op = getattr(op, '__func__', op)
+                args = obj.optional_args
+                return ('E', op, getattr(obj, 'type', None),
+                        operand(obj.first, index, 'first'),
+                        operand(obj.second, index, 'second'),
+                        tuple(sorted(args.items())) if args else None)
+            elif isinstance(obj, Table):
+                tables[id(obj)] = obj
+                return ('T', obj._tablename, obj._rname, obj._ot)
+            elif isinstance(obj, (list, tuple)):
+                return (type(obj), tuple(map(shape, obj)))
+            return obj
+        def operand(obj, index, attr):
+            if isinstance(obj, (Expression, Query, Table)):
+                return shape(obj)
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                return (type(obj), tuple(
+                    shape(item) if isinstance(item, (Expression, Query, Table))
+                    else leaf(item, (index, attr, k))
+                    for k, item in enumerate(obj)))
+            return leaf(obj, (index, attr, None))
+        def leaf(obj, position):
+            if obj is None:
+                return None
+            leaves.append(position)
+            return type(obj)
+        key = (shape(query), tuple(map(shape, fields)),
+               tuple((name, shape(value)) for name, value
+                     in sorted(attributes.items())
+                     if not name in ('cache', 'cacheable', 'processor',
+                                     'rows_class')))
+        if uncacheable:
+            return None
+        tenant_fieldname = self.db._request_tenant
+        for table in tables.values():
+            if table._common_filter is not None or tenant_fieldname in table:
+                return None
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def select_leaves(self, nodes, positions):
+        """
+        Returns the hashable values of the literals found at `positions`
+        """
+        items = {}
+        values = []
+        for position in positions:
+            value = self.select_leaf(nodes, position, items)
+            try:
+                hash(value)
+            except TypeError:
+                value = repr(value)
+            values.append(value)
+        return tuple(values)
+
+    def select_leaf(self, nodes, position, items):
+        index, attr, k = position
+        value = getattr(nodes[index], attr)
+        if k is not None:
+            if not (index, attr) in items:
+                items[index, attr] = list(value)
+            value = items[index, attr][k]
+        return value
+
+    def select_params(self, nodes, recipe):
+        items = {}
+        return tuple(
+            self.bind_value(self.select_leaf(nodes, position, items),
+                            fieldtype)
+            for position, fieldtype in recipe) or None
+
+    def select_recipe(self, nodes, trace, order):
+        """
+        Locates the literal each bound value comes from and returns the
+        `(position, fieldtype)` pairs in placeholder order, or None if any
+        of them is not a literal of the query tree (e.g. it was rewritten
+        by the adapter before being bound)
+        """
+        indexes = dict((id(node), i) for i, node in enumerate(nodes))
+        items = {}
+        cursors = {}
+        used = set()
+        traced = []
+        for owner, obj, fieldtype in trace:
+            index = indexes.get(id(owner))
+            if index is None:
+                return None
+            first, second = owner.first, owner.second
+            if first is obj and second is obj:
+                return None
+            elif second is obj:
+                position = (index, 'second', None)
+            elif first is obj:
+                position = (index, 'first', None)
+            elif isinstance(second, (list, tuple, set, frozenset)):
+                if not index in items:
+                    items[index] = list(second)
+                values = items[index]
+                # items are usually bound in order, start after the last one
+                start = cursors.get(index, 0)
+                for k in chain(range(start, len(values)), range(start)):
+                    position = (index, 'second', k)
+                    if values[k] is obj and not position in used:
+                        cursors[index] = k + 1
+                        break
+                else:
+                    return None
+            else:
+                return None
+            used.add(position)
+            traced.append((position, fieldtype))
+        return tuple(traced[i] for i in order)
+
     def execute_test_query(self):
         return self.execute(self.test_query)
 
@@ -1483,6 +1999,90 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
     def represent_exceptions(self, obj, fieldtype):
         return None
 
+    def can_bind(self, obj, fieldtype):
+        if isinstance(obj, (Expression, Field)):
+            return False
+        if isinstance(fieldtype, SQLCustomType):
+            return fieldtype.type in ('string', 'text', 'json')
+        return isinstance(fieldtype, str) and not fieldtype.startswith('geo')
+
+    def bind(self, obj, fieldtype):
+        values = self._bind_values
+        values.append(self.bind_value(obj, fieldtype))
+        if self._bind_trace is not None:
+            self._bind_trace.append((self._bind_owner, obj, fieldtype))
+        return BIND_MARKER % (len(values) - 1)
+
+    def bind_value(self, obj, fieldtype):
+        """
+        Same as `represent` but returns the value to be passed to the driver
+        as a bound parameter instead of a SQL literal
+        """
+        field_is_type = fieldtype.startswith
+        if isinstance(obj, CALLABLETYPES):
+            obj = obj()
+        if isinstance(fieldtype, SQLCustomType):
+            return fieldtype.encoder(obj) or None
+        if field_is_type('list:'):
+            if not obj:
+                obj = []
+            elif not isinstance(obj, (list, tuple)):
+                obj = [obj]
+            if field_is_type('list:string'):
+                obj = list(map(to_unicode, obj))
+            else:
+                obj = list(map(int,[o for o in obj if o != '']))
+        if isinstance(obj, (list, tuple)) and (not fieldtype == "json"):
+            obj = bar_encode(obj)
+        if obj is None:
+            return None
+        if obj == '' and not fieldtype[:2] in ['st', 'te', 'js', 'pa', 'up']:
+            return None
+        if fieldtype == 'boolean':
+            if obj and not str(obj)[:1].upper() in '0F':
+                return self.TRUE
+            return self.FALSE
+        if fieldtype == 'id' or fieldtype == 'integer':
+            return long(obj)
+        if field_is_type('decimal'):
+            return str(obj)
+        elif field_is_type('reference'):
+            referenced = fieldtype[9:].strip()
+            if referenced in self.db.tables:
+                return long(obj)
+            p = referenced.partition('.')
+            if p[2] != '':
+                try:
+                    ftype = self.db[p[0]][p[2]].type
+                    return self.bind_value(obj, ftype)
+                except (ValueError, KeyError):
+                    return obj
+            elif isinstance(obj, (Row, Reference)):
+                return obj['id']
+            return long(obj)
+        elif fieldtype == 'double':
+            return float(obj)
+        if fieldtype == 'blob':
+            if PY2:
+                obj = base64.b64encode(str(obj))
+            else:
+                obj = base64.b64encode(obj.encode('utf-8'))
+        elif fieldtype == 'date':
+            if isinstance(obj, (datetime.date, datetime.datetime)):
+                obj = obj.isoformat()[:10]
+        elif fieldtype == 'datetime':
+            if isinstance(obj, datetime.datetime):
+                obj = obj.isoformat(self.T_SEP)[:19]
+            elif isinstance(obj, datetime.date):
+                obj = obj.isoformat()[:10]+self.T_SEP+'00:00:00'
+        elif fieldtype == 'time':
+            if isinstance(obj, datetime.time):
+                obj = obj.isoformat()[:10]
+        elif fieldtype == 'json':
+            if not 'dumps' in self.driver_auto_json:
+                obj = serializers.json(obj)
+        return to_unicode(obj)
+
     def lastrowid(self, table):
         return self.cursor.lastrowid
 
@@ -1515,6 +2115,49 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
             key = REGEX_TYPE.match(field_type).group(0)
             return self.parsemap[key](value,field_type)
 
+    def value_parser(self, field_type, blob_decode=True):
+        """
+        Returns a function doing `parse_value(value, field_type, blob_decode)`
+        with all the checks depending on `field_type` done in advance, or
+        None if values are returned unchanged
+        """
+        if PY2:
+            db_codec = self.db._db_codec
+            decode = field_type != 'blob'
+            def prepare(value):
+                if decode and isinstance(value, str):
+                    try:
+                        value = value.decode(db_codec)
+                    except Exception:
+                        pass
+                if isinstance(value, unicode):
+                    value = value.encode('utf-8')
+                return value
+        else:
+            prepare = None
+        if isinstance(field_type, SQLCustomType):
+            decoder = field_type.decoder
+            if prepare is None:
+                return decoder
+            return lambda value: decoder(prepare(value))
+        if not isinstance(field_type, str) or \
+                field_type in ('string', 'text', 'password', 'upload', 'dict') \
+                or field_type.startswith('geo') or \
+                (field_type == 'blob' and not blob_decode):
+            return prepare
+        parser = self.parsemap[REGEX_TYPE.match(field_type).group(0)]
+        if prepare is None:
+            def parse(value):
+                if value is None:
+                    return value
+                return parser(value, field_type)
+        else:
+            def parse(value):
+                if value is None:
+                    return value
+                return parser(prepare(value), field_type)
+        return parse
+
     def parse_reference(self, value, field_type):
         referee = field_type[10:].strip()
         if not '.' in referee:
@@ -1530,7 +2173,13 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         # Extract the date portion from the datetime
             return value.date()
         if not isinstance(value, (datetime.date,datetime.datetime)):
-            (y, m, d) = map(int, str(value)[:10].strip().split('-'))
+            value = str(value)[:10].strip()
+            if FROMISOFORMAT:
+                try:
+                    return datetime.date.fromisoformat(value)
+                except ValueError:
+                    pass
+            (y, m, d) = map(int, value.split('-'))
             value = datetime.date(y, m, d)
         return value
 
@@ -1539,7 +2188,13 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         # Extract the time portion from the datetime
             return value.time()
         if not isinstance(value, datetime.time):
-            time_items = list(map(int,str(value)[:8].strip().split(':')[:3]))
+            value = str(value)[:8].strip()
+            if FROMISOFORMAT:
+                try:
+                    return datetime.time.fromisoformat(value)
+                except ValueError:
+                    pass
+            time_items = list(map(int,value.split(':')[:3]))
             if len(time_items) == 3:
                 (h, mi, s) = time_items
             else:
@@ -1551,6 +2206,12 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
         if not isinstance(value, datetime.datetime):
             value = str(value)
             date_part,time_part,timezone = value[:10],value[11:19],value[19:]
+            if FROMISOFORMAT and not '+' in timezone and \
+                    not '-' in timezone:
+                try:
+                    return datetime.datetime.fromisoformat(value[:19])
+                except ValueError:
+                    pass
             if '+' in timezone:
                 ms,tz = timezone.split('+')
                 h,m = tz.split(':')
@@ -1709,6 +2370,183 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
                     pass # not enough fields to define virtual field
         return new_row
 
+    def row_parser(self, colnames, fields, blob_decode=True, cacheable=False,
+                   expanded=None, convert=True):
+        """
+        Returns a function parsing a row fetched from the cursor into a
+        `Row`, same as `_parse` does. The work depending only on the columns
+        (field lookups, converters for the field types, ...) is done once
+        and reused by the selects with the same colnames.
+
+        `expanded` is the result of `_parse_expand_colnames(colnames)`, if
+        already available. With `convert=False` the values are expected to
+        be already parsed (see `column_parsers`).
+        """
+        (fields_virtual, fields_lazy, tmps) = expanded or \
+            self._parse_expand_colnames(colnames)
+        key = (tuple(colnames), blob_decode, cacheable, convert, tuple(
+            (id(tmp[3]), len(tmp[2]._referenced_by)) if tmp
+            else fields[j].type for j, tmp in enumerate(tmps)))
+        if self._row_parsers is None:
+            self._row_parsers = OrderedDict()
+        # the cached tmps keep the fields alive, so their ids stay unique
+        (tmps, parse_columns) = self._row_parsers.pop(key, (tmps, None))
+        if parse_columns is None:
+            parse_columns = self.build_row_parser(
+                colnames, fields, tmps, blob_decode, cacheable, convert)
+        self._row_parsers[key] = (tmps, parse_columns)
+        while len(self._row_parsers) > self.parser_cache_size:
+            self._row_parsers.popitem(last=False)
+        if not any(fields_virtual.values()) and \
+                not any(fields_lazy.values()):
+            return parse_columns
+        def parse_row(row):
+            new_row = parse_columns(row)
+            for tablename in fields_virtual.keys():
+                for f, v in fields_virtual[tablename]:
+                    try:
+                        new_row[tablename][f] = v.f(new_row)
+                    except (AttributeError, KeyError):
+                        pass # not enough fields to define virtual field
+                for f, v in fields_lazy[tablename]:
+                    try:
+                        new_row[tablename][f] = \
+                            (v.handler or VirtualCommand)(v.f, new_row)
+                    except (AttributeError, KeyError):
+                        pass # not enough fields to define virtual field
+            return new_row
+        return parse_row
+
+    def column_parsers(self, fields, tmps, blob_decode=True):
+        """
+        Returns the functions parsing the values of each column, including
+        the `filter_out` of the fields (None for values returned unchanged)
+        """
+        parsers = []
+        for (j, tmp) in enumerate(tmps):
+            if tmp:
+                field = tmp[3]
+                if tmp[4] in self.native_types and \
+                        not tmp[4] in self.long_types:
+                    # only for table columns: the driver knows their types
+                    convert = None
+                else:
+                    convert = self.value_parser(tmp[4], blob_decode)
+                if field.filter_out:
+                    convert = self._filter_out_parser(convert, field.filter_out)
+            else:
+                convert = self.value_parser(fields[j].type, blob_decode)
+            parsers.append(convert)
+        return parsers
+
+    def build_row_parser(self, colnames, fields, tmps, blob_decode,
+                         cacheable, convert=True):
+        if convert:
+            parsers = self.column_parsers(fields, tmps, blob_decode)
+        else:
+            parsers = [None] * len(colnames)
+        row_classes = {}
+        afters = {}
+        for (j, tmp) in enumerate(tmps):
+            if tmp and tmp[4] == 'id':
+                (tablename, fieldname, table) = tmp[:3]
+                row_classes[tablename], afters[j] = self.id_parser(
+                    tablename, fieldname, table, cacheable)
+        # slots are the items of the new row, in the order `_parse` sets
+        # them: a Row per table (and '_extra') or the value of an alias
+        slots = []
+        columns = []
+        containers = {}
+        for (j, colname) in enumerate(colnames):
+            tmp = tmps[j]
+            if tmp:
+                (tablename, fieldname, table, field, ft) = tmp
+                if not tablename in containers:
+                    containers[tablename] = len(containers)
+                    slots.append(
+                        (tablename, None, row_classes.get(tablename, Row)))
+                columns.append((j, containers[tablename], fieldname,
+                                parsers[j], afters.get(j)))
+            else:
+                if not '_extra' in containers:
+                    containers['_extra'] = len(containers)
+                    slots.append(('_extra', None, Row))
+                columns.append(
+                    (j, containers['_extra'], colname, parsers[j], None))
+                new_column_name = REGEX_SELECT_AS_PARSER.search(colname)
+                if not new_column_name is None:
+                    slots.append((new_column_name.group(1), j, None))
+        def parse_columns(row):
+            new_row = Row()
+            colsets = []
+            for name, j, row_class in slots:
+                if j is None:
+                    colset = new_row[name] = row_class()
+                    colsets.append(colset)
+                else:
+                    new_row[name] = row[j]
+            for j, c, fieldname, convert, after in columns:
+                value = row[j]
+                if convert is not None:
+                    value = convert(value)
+                colset = colsets[c]
+                colset[fieldname] = value
+                if after is not None:
+                    after(colset, value)
+            return new_row
+        return parse_columns
+
+    def _filter_out_parser(self, convert, filter_out):
+        if convert is None:
+            return filter_out
+        return lambda value: filter_out(convert(value))
+
+    def id_parser(self, tablename, fieldname, table, cacheable):
+        """
+        Returns the class of the records of `table` and the function to
+        call (if any) once the id is parsed into `fieldname`.
+
+        Unless `cacheable`, the class is a `LazyRow` whose `update_record`,
+        `delete_record` and referencing sets are built only when accessed
+        """
+        # for backward compatibility
+        add_id = fieldname != 'id' and not 'id' in table.fields
+        gae = self.dbengine == 'google:datastore' and not cacheable
+        if add_id or gae:
+            def after(colset, value):
+                if add_id:
+                    colset['id'] = value
+                if gae:
+                    colset[fieldname] = value.key.id()
+                    colset.gae_item = value
+        else:
+            after = None
+        if cacheable:
+            return Row, after
+        def record_id(colset):
+            return colset.__dict__[fieldname]
+        attributes = [
+            LazyRowAttribute('update_record', lambda colset: RecordUpdater(
+                colset, table, record_id(colset)), RecordUpdater),
+            LazyRowAttribute('delete_record', lambda colset: RecordDeleter(
+                table, record_id(colset)), RecordDeleter)]
+        if table._db._lazy_tables:
+            attributes.append(LazyRowAttribute(
+                '__get_lazy_reference__', lambda colset: LazyReferenceGetter(
+                    table, record_id(colset)), LazyReferenceGetter))
+        for rfield in table._referenced_by:
+            referee_link = self.db._referee_name and \
+                self.db._referee_name % dict(
+                table=rfield.tablename,field=rfield.name)
+            if referee_link and referee_link != tablename and \
+                    not referee_link in table.fields:
+                attributes.append(LazyRowAttribute(
+                    referee_link, lambda colset, rfield=rfield: LazySet(
+                        rfield, record_id(colset)), LazySet))
+        # the order of the keys of the records parsed by `after`
+        anchor = 'gae_item' if gae else 'id' if add_id else fieldname
+        return LazyRow.subclass(attributes, anchor), after
+
     def _parse_expand_colnames(self, colnames):
         """
         - Expand a list of colnames into a list of
@@ -1738,17 +2576,14 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
 
     def parse(self, rows, fields, colnames, blob_decode=True,
               cacheable = False):
-        new_rows = []
-        (fields_virtual, fields_lazy, tmps) = self._parse_expand_colnames(colnames)
-        for row in rows:
-            new_row = self._parse(row, tmps, fields,
-                                  colnames, blob_decode, cacheable,
-                                  fields_virtual, fields_lazy)
-            new_rows.append(new_row)
+        expanded = self._parse_expand_colnames(colnames)
+        parse_row = self.row_parser(colnames, fields, blob_decode, cacheable,
+                                    expanded)
+        new_rows = list(map(parse_row, rows))
         rowsobj = Rows(self.db, new_rows, colnames, rawrows=rows)
 
         # Old stype virtual fields
-        for tablename in fields_virtual.keys():
+        for tablename in expanded[0].keys():
             table = self.db[tablename]
             ### old style virtual fields
             for item in table.virtualfields:
@@ -1759,14 +2594,248 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
                     pass
         return rowsobj
 
+    def parse_columnar(self, rows, fields, colnames, blob_decode=True,
+                       cacheable=False):
+        """
+        Same as `parse` but returns a `ColumnarRows`: the values are parsed
+        and stored by column, `Row` objects are built only when accessed
+        """
+        expanded = self._parse_expand_colnames(colnames)
+        parsers = self.column_parsers(fields, expanded[2], blob_decode)
+        columns = list(zip(*rows)) or [()] * len(colnames)
+        columns = [list(map(convert, column)) if convert else column
+                   for column, convert in zip(columns, parsers)]
+        row_builder = self.row_parser(colnames, fields, blob_decode,
+                                      cacheable, expanded, convert=False)
+        rowsobj = ColumnarRows(self.db, columns, colnames, row_builder)
+
+        # Old stype virtual fields
+        for tablename in expanded[0].keys():
+            table = self.db[tablename]
+            for item in table.virtualfields:
+                try:
+                    rowsobj = rowsobj.setvirtualfields(**{tablename:item})
+                except (KeyError, AttributeError):
+                    # to avoid breaking virtualfields when partial select
+                    pass
+        return rowsobj
+
+    def parse_compact(self, rows, fields, colnames, blob_decode=True,
+                      cacheable=False):
+        """
+        Same as `parse` but the records are read-only `CompactRow` objects
+        sharing one `RowIndex`: they don't have `update_record`,
+        `delete_record` nor the referencing sets, the virtual fields that
+        can't be computed from the selected columns are None and the old
+        style virtual fields are not supported
+        """
+        (fields_virtual, fields_lazy, tmps) = \
+            self._parse_expand_colnames(colnames)
+        parsers = [(j, convert) for (j, convert) in enumerate(
+            self.column_parsers(fields, tmps, blob_decode)) if convert]
+        index = RowIndex()
+        def container(name):
+            if not name in index:
+                index[name] = RowIndex()
+                index.names.append(name)
+            return index[name]
+        for (j, colname) in enumerate(colnames):
+            tmp = tmps[j]
+            if tmp:
+                (tablename, fieldname, table, field, ft) = tmp
+                colset = container(tablename)
+                colset[fieldname] = index[colname] = \
+                    colset[colname] = j
+                colset.names.append(fieldname)
+                # for backward compatibility
+                if ft == 'id' and fieldname != 'id' and \
+                        not 'id' in table.fields:
+                    colset['id'] = j
+                    colset.names.append('id')
+            else:
+                colset = container('_extra')
+                colset[colname] = index[colname] = j
+                colset.names.append(colname)
+                new_column_name = REGEX_SELECT_AS_PARSER.search(colname)
+                if not new_column_name is None:
+                    index[new_column_name.group(1)] = j
+                    index.names.append(new_column_name.group(1))
+        # the virtual fields take the positions after the columns
+        virtuals = []
+        for tablename in fields_virtual.keys():
+            colset = index[tablename]
+            for f, v in fields_virtual[tablename]:
+                colset[f] = len(colnames) + len(virtuals)
+                colset.names.append(f)
+                virtuals.append((colset[f], v.f, None))
+            for f, v in fields_lazy[tablename]:
+                colset[f] = len(colnames) + len(virtuals)
+                colset.names.append(f)
+                virtuals.append((colset[f], v.f, v.handler or VirtualCommand))
+        padding = [None] * len(virtuals)
+        records = []
+        for row in rows:
+            if parsers or virtuals:
+                values = list(row) + padding
+                for j, convert in parsers:
+                    values[j] = convert(values[j])
+                row = values
+            record = index.row(tuple(row))
+            if virtuals:
+                record._values = values
+                for (j, f, handler) in virtuals:
+                    try:
+                        values[j] = f(record) if handler is None \
+                            else handler(f, record)
+                    except (AttributeError, KeyError):
+                        pass # not enough fields to define virtual field
+                record._values = tuple(values)
+            records.append(record)
+        return Rows(self.db, records, colnames, rawrows=rows)
+
+    def parse_arrays(self, rows, fields, colnames, blob_decode=True,
+                     cacheable=False, structured=False):
+        """
+        A select processor returning the columns as numpy arrays, see
+        `numpy_arrays`
+        """
+        tmps = self._parse_expand_colnames(colnames)[2]
+        parsers = self.column_parsers(fields, tmps, blob_decode)
+        columns = list(zip(*rows)) or [()] * len(colnames)
+        columns = [list(map(convert, column)) if convert else column
+                   for column, convert in zip(columns, parsers)]
+        field_types = [tmp[4] if tmp else fields[j].type
+                       for (j, tmp) in enumerate(tmps)]
+        return self.numpy_arrays(columns, colnames, field_types, structured)
+
+    def numpy_arrays(self, columns, colnames, field_types, structured=False):
+        """
+        Returns an OrderedDict colname -> numpy array of the (parsed) values
+        of the column or, if `structured`, a structured array with a field
+        for each column
+        """
+        if numpy is None:
+            raise RuntimeError('numpy is not installed')
+        arrays = [self.numpy_array(column, field_type)
+                  for column, field_type in zip(columns, field_types)]
+        if not structured:
+            return OrderedDict(zip(colnames, arrays))
+        array = numpy.empty(len(columns[0]) if columns else 0,
+                            dtype=[(str(colname), a.dtype)
+                                   for colname, a in zip(colnames, arrays)])
+        for colname, a in zip(colnames, arrays):
+            array[str(colname)] = a
+        return array
+
+    def numpy_field_type(self, values):
+        """
+        Returns the field type of the values of a column selected as an
+        expression, by `numpy_value_types`, or None if they don't share one
+        """
+        value_types = set(type(value) for value in values
+                          if value is not None)
+        if len(value_types) != 1:
+            return None
+        return self.numpy_value_types.get(value_types.pop())
+
+    def numpy_array(self, values, field_type):
+        """
+        Returns the values of a column of `field_type` as a numpy array, with
+        the dtype given by `numpy_types` unless the values don't fit it
+        (e.g. NULLs in an integer column)
+        """
+        dtype = None
+        if isinstance(field_type, str):
+            dtype = self.numpy_types.get(REGEX_TYPE.match(field_type).group(0))
+        if dtype in ('int64', 'bool') and None in values:
+            dtype = None
+        if dtype is not None:
+            try:
+                return numpy.array(values, dtype=dtype)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        # item by item, since lists would make a multidimensional array
+        array = numpy.empty(len(values), dtype='object')
+        for (i, value) in enumerate(values):
+            array[i] = value
+        return array
+
+    def rows_serializer(self, fields, colnames, compact=True):
+        """
+        Returns the `RowsSerializer` of the rows selected as `colnames`
+        """
+        tmps = self._parse_expand_colnames(colnames)[2]
+        parsers = self.column_parsers(fields, tmps)
+        field_types = []
+        names = []
+        layout = []
+        containers = {}
+        for (j, colname) in enumerate(colnames):
+            tmp = tmps[j]
+            if tmp:
+                (tablename, fieldname) = tmp[:2]
+                field_types.append(tmp[4])
+                names.append('%s.%s' % (tablename, fieldname))
+            else:
+                (tablename, fieldname) = ('_extra', colname)
+                field_types.append(fields[j].type)
+                names.append(colname)
+            if not tablename in containers:
+                containers[tablename] = []
+                layout.append((tablename, containers[tablename]))
+            containers[tablename].append((fieldname, j))
+            if not tmp:
+                new_column_name = REGEX_SELECT_AS_PARSER.search(colname)
+                if not new_column_name is None:
+                    layout.append((new_column_name.group(1), j))
+        flat = compact and len(layout) == 1 and layout[0][0] != '_extra'
+        extras = [j for (j, tmp) in enumerate(tmps) if not tmp]
+        return RowsSerializer(names, field_types, parsers,
+                              layout[0][1] if flat else layout, flat, extras)
+
+    def select_chunks(self, query, fields, attributes, format='json',
+                      **options):
+        """
+        Returns the generator of the chunks of the JSON or CSV serialization
+        (see `RowsSerializer`) of the select, run when the first chunk is
+        requested: the rows are fetched in batches of `fetch_size` from the
+        cursor of `iter_cursor`, released when the generator is exhausted or
+        closed
+        """
+        if not format in ('json', 'csv'):
+            raise SyntaxError('invalid format: %s' % format)
+        fetch_size = attributes.pop('fetch_size', None) or self.fetch_size
+        compact = attributes.pop('compact', True)
+        sql, params = self.build_select(query, fields, attributes)
+        serializer = self.rows_serializer(fields, self._colnames, compact)
+        def chunks():
+            cursor = self.iter_cursor(sql, params)
+            def batches():
+                while True:
+                    rows = self._fetchmany(fetch_size, cursor)
+                    if not rows:
+                        return
+                    yield rows
+            try:
+                if format == 'json':
+                    serialized = serializer.json_chunks(batches())
+                else:
+                    serialized = serializer.csv_chunks(batches(), **options)
+                for chunk in serialized:
+                    yield chunk
+            finally:
+                self.close_iter_cursor(cursor)
+        return chunks()
+
     def iterparse(self, sql, fields, colnames, blob_decode=True,
-                  cacheable=False):
+                  cacheable=False, params=None, fetch_size=None):
         """
-        Iterator to parse one row at a time.
+        Iterator to parse one row at a time, fetched `fetch_size` (default
+        `self.fetch_size`) at once.
         It doen't support the old style virtual fields
         """
-        return IterRows(self.db, sql, fields,
-                        colnames, blob_decode, cacheable)
+        return IterRows(self.db, sql, fields, colnames, blob_decode,
+                        cacheable, params, fetch_size or self.fetch_size)
 
 
     def common_filter(self, query, tablenames):
@@ -1813,6 +2882,7 @@ class BaseAdapter(with_metaclass(AdapterMeta, ConnectionPool)):
 
 class NoSQLAdapter(BaseAdapter):
     can_select_for_update = False
+    can_bind_params = False
     QUOTE_TEMPLATE = '%s'
 
     def __init__(self, db, uri, pool_size=0, folder=None, db_codec='UTF-8',
@@ -1874,6 +2944,10 @@ class NoSQLAdapter(BaseAdapter):
     def id_query(self, table):
         return table._id > 0
 
+    def approximate_count(self, query):
+        # the record counters are kept by the inserts of the SQL adapters
+        return self.count(query)
+
     def execute_test_query(self):
         ''' NoSql DBs don't have a universal query language.  Override this
             specifc driver if need to test connection status.  Throw exception
@@ -8,6 +8,7 @@ from .base import BaseAdapter
 
 class DB2Adapter(BaseAdapter):
     drivers = ('ibm_db_dbi', 'pyodbc')
+    can_bind_params = False
 
     types = {
         'boolean': 'CHAR(1)',
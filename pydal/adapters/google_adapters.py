@@ -97,6 +97,8 @@ class GoogleDatastoreAdapter(NoSQLAdapter):
     MAX_FETCH_LIMIT = 1000000
     uploads_in_blob = True
     types = {}
+    # the IN filters of the datastore take at most 30 values
+    belongs_size = 30
 
     def file_exists(self, filename): pass
     def file_open(self, filename, mode='rb', lock=True): pass
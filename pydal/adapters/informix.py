@@ -8,6 +8,7 @@ from .base import BaseAdapter
 
 class InformixAdapter(BaseAdapter):
     drivers = ('informixdb',)
+    can_bind_params = False
 
     types = {
         'boolean': 'CHAR(1)',
@@ -3,7 +3,7 @@ import re
 import sys
 
 from .._globals import IDENTITY
-from .._compat import PY2, to_unicode, iteritems, integer_types
+from .._compat import PY2, to_unicode, iteritems, integer_types, basestring
 from ..objects import Expression
 from ..helpers.methods import varquote_aux
 from .base import BaseAdapter
@@ -195,10 +195,11 @@ class MSSQLAdapter(BaseAdapter):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape * 2)
+                if isinstance(second, basestring):
+                    second = second.replace(escape, escape * 2)
+            second = self.expand(second, 'string')
         return "(%s LIKE %s ESCAPE '%s')" % (self.expand(first),
                 second, escape)
 
@@ -207,10 +208,13 @@ class MSSQLAdapter(BaseAdapter):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string').lower()
+            if isinstance(second, basestring):
+                second = second.lower()
+                if escape is None:
+                    second = second.replace('\\', '\\\\')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape*2)
+            second = self.expand(second, 'string')
         return "(LOWER(%s) LIKE %s ESCAPE '%s')" % (self.expand(first),
                 second, escape)
 
@@ -455,10 +459,13 @@ class MSSQL2Adapter(MSSQLAdapter):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string').lower()
+            if isinstance(second, basestring):
+                second = second.lower()
+                if escape is None:
+                    second = second.replace('\\', '\\\\')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape*2)
+            second = self.expand(second, 'string')
         if second.startswith("n'"):
             second = "N'" + second[2:]
         return "(LOWER(%s) LIKE %s ESCAPE '%s')" % (self.expand(first),
@@ -522,10 +529,13 @@ class MSSQLNAdapter(MSSQLAdapter):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string').lower()
+            if isinstance(second, basestring):
+                second = second.lower()
+                if escape is None:
+                    second = second.replace('\\', '\\\\')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape*2)
+            second = self.expand(second, 'string')
         if second.startswith("n'"):
             second = "N'" + second[2:]
         return "(LOWER(%s) LIKE %s ESCAPE '%s')" % (self.expand(first),
@@ -655,6 +665,7 @@ class MSSQL4NAdapter(MSSQLNAdapter):
 
 class VerticaAdapter(MSSQLAdapter):
     drivers = ('pyodbc',)
+    can_bind_params = False
     T_SEP = ' '
 
     types = {
@@ -11,6 +11,9 @@ class MySQLAdapter(BaseAdapter):
 
     commit_on_alter_table = True
     support_distributed_transaction = True
+    # TIME columns are returned as timedelta
+    native_types = frozenset(('id', 'integer', 'bigint', 'float', 'double',
+                              'date', 'datetime'))
     types = {
         'boolean': 'CHAR(1)',
         'string': 'VARCHAR(%(length)s)',
@@ -10,6 +10,7 @@ from .base import BaseAdapter
 
 class OracleAdapter(BaseAdapter):
     drivers = ('cx_Oracle',)
+    can_bind_params = False
 
     commit_on_alter_table = False
     types = {
@@ -186,6 +187,14 @@ class OracleAdapter(BaseAdapter):
         else:
             return self.cursor.fetchall()
 
+    def _fetchmany(self, size, cursor=None):
+        cursor = cursor or self.cursor
+        rows = cursor.fetchmany(size)
+        if any(x[1]==cx_Oracle.LOB for x in cursor.description):
+            return [tuple([(c.read() if type(c) == cx_Oracle.LOB else c) \
+                               for c in r]) for r in rows]
+        return rows
+
     def sqlsafe_table(self, tablename, ot=None):
         if ot is not None:
             return (self.QUOTE_TEMPLATE + ' ' \
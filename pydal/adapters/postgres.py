@@ -1,20 +1,46 @@
 # -*- coding: utf-8 -*-
 import re
+import weakref
 
 from .._globals import IDENTITY
+from .._load import OrderedDict
 from ..drivers import psycopg2_adapt
-from .._compat import PY2
+from .._compat import PY2, basestring
 from ..helpers.methods import varquote_aux
 from .base import BaseAdapter
 from ..objects import Expression
 
 
+class PreparedStatements(object):
+    """
+    Statements PREPAREd on a connection, with the number of times the not
+    yet prepared ones have been seen
+    """
+    def __init__(self):
+        self.names = OrderedDict()
+        self.counts = OrderedDict()
+        self.sequence = 0
+
+
 class PostgreSQLAdapter(BaseAdapter):
     drivers = ('psycopg2','pg8000')
 
     QUOTE_TEMPLATE = '"%s"'
 
     support_distributed_transaction = True
+    native_types = frozenset(('id', 'integer', 'bigint', 'float', 'double',
+                              'decimal', 'date', 'time', 'datetime'))
+    #: max number of statements PREPAREd on each connection (0 disables)
+    prepared_statements = 0
+    #: times a statement has to be executed before being PREPAREd
+    prepare_threshold = 3
+    #: connection -> PreparedStatements, shared since pools recycle them
+    PREPARED = weakref.WeakKeyDictionary()
+    #: iterselect fetches from a named (server-side) cursor with psycopg2
+    server_side_cursors = True
+    _iter_cursors = 0
+    #: the named cursors of `iter_cursor` still open
+    _held_cursors = None
     types = {
         'boolean': 'CHAR(1)',
         'string': 'VARCHAR(%(length)s)',
@@ -109,6 +135,10 @@ class PostgreSQLAdapter(BaseAdapter):
         self.db_codec = db_codec
         self._after_connection = after_connection
         self.srid = srid
+        self.prepared_statements = adapter_args.get(
+            'prepared_statements', self.prepared_statements)
+        self.server_side_cursors = adapter_args.get(
+            'server_side_cursors', self.server_side_cursors)
         self.find_or_make_work_folder()
         self._last_insert = None # for INSERT ... RETURNING ID
         self.TRUE_exp = 'TRUE'
@@ -174,6 +204,19 @@ class PostgreSQLAdapter(BaseAdapter):
             self._last_insert
             return self._insert_empty(table)
 
+    def estimate_count(self, sqlsafe):
+        # the statistics of the last VACUUM or ANALYZE scaled to the current
+        # size of the table, as by the planner
+        self.execute("SELECT reltuples, relpages, pg_relation_size(oid) / "
+                     "current_setting('block_size')::integer FROM pg_class "
+                     "WHERE oid = %s::regclass;" % self.adapt(sqlsafe))
+        row = self.cursor.fetchone()
+        if row is None or row[0] <= 0 or row[1] <= 0:
+            # never analyzed (or empty, then counting is cheap)
+            return None
+        reltuples, relpages, pages = row
+        return int(reltuples / relpages * pages)
+
     def lastrowid(self, table=None):
         if self._last_insert:
             return int(self.cursor.fetchone()[0])
@@ -207,10 +250,11 @@ class PostgreSQLAdapter(BaseAdapter):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape * 2)
+                if isinstance(second, basestring):
+                    second = second.replace(escape, escape * 2)
+            second = self.expand(second, 'string')
         if first.type not in ('string', 'text', 'json'):
             return "(%s LIKE %s ESCAPE '%s')" % (
                 self.CAST(self.expand(first), 'CHAR(%s)' % first.length),
@@ -224,10 +268,11 @@ class PostgreSQLAdapter(BaseAdapter):
         if isinstance(second, Expression):
             second = self.expand(second, 'string')
         else:
-            second = self.expand(second, 'string')
             if escape is None:
                 escape = '\\'
-                second = second.replace(escape, escape * 2)
+                if isinstance(second, basestring):
+                    second = second.replace(escape, escape * 2)
+            second = self.expand(second, 'string')
         if first.type not in ('string', 'text', 'json', 'list:string'):
             return "(%s ILIKE %s ESCAPE '%s')" % (
                 self.CAST(self.expand(first), 'CHAR(%s)' % first.length),
@@ -359,6 +404,133 @@ class PostgreSQLAdapter(BaseAdapter):
             a[0] = a[0].decode('utf8')
         return BaseAdapter.execute(self, *a, **b)
 
+    REGEX_PLACEHOLDER = re.compile('%(%|s)')
+
+    def execute_bound(self, sql, params=None):
+        """
+        With `param_style='bind'` and `adapter_args={'prepared_statements':
+        n}`, once a statement has been executed `prepare_threshold` times
+        it is PREPAREd on the connection (keeping the `n` most recently used
+        ones) and then run with EXECUTE
+        """
+        name = None
+        if self.prepared_statements and self.param_style == 'bind':
+            name = self.prepared_name(sql)
+        if name is None:
+            return BaseAdapter.execute_bound(self, sql, params)
+        if params:
+            return self.execute('EXECUTE %s (%s);' % (
+                name, ','.join(['%s'] * len(params))), params)
+        return self.execute('EXECUTE %s;' % name)
+
+    def iter_cursor(self, sql, params=None):
+        """
+        With psycopg2 the rows of `iterselect` are fetched from a named
+        cursor, so they are kept on the server until fetched (and the
+        connection can run other queries meanwhile). The cursor is closed
+        once exhausted or released, and at the end of the transaction (so a
+        pooled connection doesn't keep it on the server).
+        """
+        if not self.server_side_cursors or self.driver_name != 'psycopg2':
+            return BaseAdapter.iter_cursor(self, sql, params)
+        PostgreSQLAdapter._iter_cursors += 1
+        cursor = self.connection.cursor(
+            'pydal_iter_%d' % PostgreSQLAdapter._iter_cursors, withhold=True)
+        cursor, self.cursor = self.cursor, cursor
+        try:
+            # a named cursor can't run the EXECUTE of prepared statements
+            BaseAdapter.execute_bound(self, sql, params)
+        finally:
+            cursor, self.cursor = self.cursor, cursor
+        if self._held_cursors is None:
+            self._held_cursors = []
+        self._held_cursors.append(cursor)
+        return cursor
+
+    def close_iter_cursor(self, cursor):
+        if self._held_cursors and cursor in self._held_cursors:
+            self._held_cursors.remove(cursor)
+        BaseAdapter.close_iter_cursor(self, cursor)
+
+    def close_iter_cursors(self):
+        cursors, self._held_cursors = self._held_cursors, None
+        for cursor in cursors or ():
+            try:
+                cursor.close()
+            except Exception:
+                # the connection may be broken already
+                pass
+
+    def commit(self):
+        self.close_iter_cursors()
+        return BaseAdapter.commit(self)
+
+    def rollback(self):
+        self.close_iter_cursors()
+        return BaseAdapter.rollback(self)
+
+    def close_connection(self):
+        self.close_iter_cursors()
+        return BaseAdapter.close_connection(self)
+
+    def prepared_name(self, sql):
+        """
+        Returns the name of the statement PREPAREd for `sql` on the current
+        connection, preparing it if it has been seen often enough
+        """
+        try:
+            registry = self.PREPARED.get(self.connection)
+            if registry is None:
+                registry = self.PREPARED[self.connection] = \
+                    PreparedStatements()
+        except TypeError:
+            # connection objects not supporting weak references
+            return None
+        names, counts = registry.names, registry.counts
+        name = names.pop(sql, None)
+        if name is not None:
+            names[sql] = name
+            return name or None
+        count = counts.pop(sql, 0) + 1
+        if count < self.prepare_threshold:
+            counts[sql] = count
+            while len(counts) > 4 * self.prepared_statements:
+                counts.popitem(last=False)
+            return None
+        registry.sequence += 1
+        name = 'pydal_%d' % registry.sequence
+        # False marks the statements that can't be prepared
+        names[sql] = self.prepare_statement(name, sql) and name
+        while len(names) > self.prepared_statements:
+            old = names.popitem(last=False)[1]
+            if old:
+                self.execute('DEALLOCATE %s;' % old)
+        return names[sql] or None
+
+    def prepare_statement(self, name, sql):
+        """
+        PREPAREs `sql` (using driver placeholders) as `name`. A savepoint
+        keeps the transaction usable if the server refuses it.
+        """
+        counter = [0]
+        def placeholder(m):
+            if m.group(1) == '%':
+                return '%'
+            counter[0] += 1
+            return '$%d' % counter[0]
+        sql = self.REGEX_PLACEHOLDER.sub(placeholder, sql).rstrip().rstrip(';')
+        try:
+            self.execute('SAVEPOINT pydal_prepare;')
+        except Exception:
+            return False
+        try:
+            self.execute('PREPARE %s AS %s;' % (name, sql))
+        except Exception:
+            self.execute('ROLLBACK TO SAVEPOINT pydal_prepare;')
+            return False
+        self.execute('RELEASE SAVEPOINT pydal_prepare;')
+        return True
+
 
 class NewPostgreSQLAdapter(PostgreSQLAdapter):
     drivers = ('psycopg2','pg8000')
@@ -415,6 +587,11 @@ class NewPostgreSQLAdapter(PostgreSQLAdapter):
             return 'ARRAY[%s]' % ','.join(repr(item) for item in obj)
         return PostgreSQLAdapter.represent(self, obj, fieldtype)
 
+    def can_bind(self, obj, fieldtype):
+        if isinstance(fieldtype, str) and fieldtype.startswith('list:'):
+            return False
+        return PostgreSQLAdapter.can_bind(self, obj, fieldtype)
+
     def CONTAINS(self, first, second, case_sensitive=True):
         if first.type.startswith('list'):
             f = self.expand(second, 'string')
@@ -447,6 +624,7 @@ class NewPostgreSQLAdapter(PostgreSQLAdapter):
 
 class JDBCPostgreSQLAdapter(PostgreSQLAdapter):
     drivers = ('zxJDBC',)
+    native_types = frozenset()
 
     REGEX_URI = re.compile('^(?P<user>[^:@]+)(\:(?P<password>[^@]*))?@(?P<host>[^\:/]+)(\:(?P<port>[0-9]+))?/(?P<db>.+)$')
 
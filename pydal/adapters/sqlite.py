@@ -17,6 +17,8 @@ class SQLiteAdapter(BaseAdapter):
 
     can_select_for_update = None    # support ourselves with BEGIN TRANSACTION
 
+    native_types = frozenset(('id', 'integer', 'bigint', 'float', 'double'))
+
     def EXTRACT(self,field,what):
         return "web2py_extract('%s',%s)" % (what, self.expand(field))
 
@@ -72,11 +74,19 @@ class SQLiteAdapter(BaseAdapter):
             driver_args['check_same_thread'] = False
         if not 'detect_types' in driver_args and do_connect:
             driver_args['detect_types'] = self.driver.PARSE_DECLTYPES
+        self.detect_native_types(driver_args)
         def connector(dbpath=self.dbpath, driver_args=driver_args):
             return self.driver.Connection(dbpath, **driver_args)
         self.connector = connector
         if do_connect: self.reconnect()
 
+    def detect_native_types(self, driver_args):
+        # with PARSE_DECLTYPES the driver converts DATE and TIMESTAMP columns
+        detect_types = driver_args.get('detect_types', 0)
+        if self.driver and detect_types & self.driver.PARSE_DECLTYPES:
+            self.native_types = self.native_types | \
+                frozenset(('date', 'datetime'))
+
     def after_connection(self):
         self.connection.create_function('web2py_extract', 2,
                                         SQLiteAdapter.web2py_extract)
@@ -111,6 +121,19 @@ class SQLiteAdapter(BaseAdapter):
 
         return counter
 
+    def estimate_count(self, sqlsafe):
+        # the number of records counted by the last ANALYZE, if any
+        self.execute("SELECT name FROM sqlite_master "
+                     "WHERE type='table' AND name='sqlite_stat1';")
+        if self.cursor.fetchone() is None:
+            return None
+        self.execute('SELECT stat FROM sqlite_stat1 WHERE tbl=%s;' %
+                     self.adapt(sqlsafe.strip('"')))
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        return int(row[0].split()[0])
+
     def select(self, query, fields, attributes):
         """
         Simulate `SELECT ... FOR UPDATE` with `BEGIN IMMEDIATE TRANSACTION`.
@@ -160,6 +183,7 @@ class SpatiaLiteAdapter(SQLiteAdapter):
             driver_args['check_same_thread'] = False
         if not 'detect_types' in driver_args and do_connect:
             driver_args['detect_types'] = self.driver.PARSE_DECLTYPES
+        self.detect_native_types(driver_args)
         def connector(dbpath=self.dbpath, driver_args=driver_args):
             return self.driver.Connection(dbpath, **driver_args)
         self.connector = connector
@@ -239,6 +263,8 @@ class SpatiaLiteAdapter(SQLiteAdapter):
 
 class JDBCSQLiteAdapter(SQLiteAdapter):
     drivers = ('zxJDBC_sqlite',)
+    can_bind_params = False
+    native_types = frozenset()
 
     def __init__(self, db, uri, pool_size=0, folder=None, db_codec='UTF-8',
                  credential_decoder=IDENTITY, driver_args={},
@@ -137,7 +137,8 @@ from ._compat import PY2, pickle, hashlib_md5, pjoin, copyreg, integer_types, \
     with_metaclass
 from ._globals import GLOBAL_LOCKER, THREAD_LOCAL, DEFAULT
 from ._load import OrderedDict
-from .helpers.classes import Serializable, SQLCallableList, BasicStorage
+from .helpers.classes import Serializable, SQLCallableList, BasicStorage, \
+    IdentityMap
 from .helpers.methods import hide_password, smart_query, auto_validators, \
     auto_represent
 from .helpers.regex import REGEX_PYTHON_KEYWORDS, REGEX_DBNAME, \
@@ -234,6 +235,10 @@ class DAL(with_metaclass(MetaDAL, Serializable, BasicStorage)):
         lazy_tables: delaya table definition until table access
         after_connection: can a callable that will be executed after the
             connection
+        param_style: how literals are sent to the database when executing
+            statements. With the default `'inline'` they are quoted into the
+            SQL string, with `'bind'` the SQL contains driver placeholders
+            and values are passed separately to `cursor.execute`
 
     Example:
         Use as::
@@ -255,6 +260,7 @@ class DAL(with_metaclass(MetaDAL, Serializable, BasicStorage)):
     representers = {}
     uuid = lambda x: str(uuid4())
     logger = logging.getLogger("pyDAL")
+    _identity_map = None
 
     Table = Table
 
@@ -369,7 +375,7 @@ class DAL(with_metaclass(MetaDAL, Serializable, BasicStorage)):
                  bigint_id=False, debug=False, lazy_tables=False,
                  db_uid=None, do_connect=True,
                  after_connection=None, tables=None, ignore_field_case=True,
-                 entity_quoting=False, table_hash=None):
+                 entity_quoting=False, table_hash=None, param_style='inline'):
 
         if uri == '<zombie>' and db_uid is not None:
             return
@@ -433,7 +439,8 @@ class DAL(with_metaclass(MetaDAL, Serializable, BasicStorage)):
                                       adapter_args=adapter_args or {},
                                       do_connect=do_connect,
                                       after_connection=after_connection,
-                                      entity_quoting=entity_quoting)
+                                      entity_quoting=entity_quoting,
+                                      param_style=param_style)
                         self._adapter = ADAPTERS[self._dbname](**kwargs)
                         types = ADAPTERS[self._dbname].types
                         # copy so multiple DAL() possible
@@ -461,7 +468,8 @@ class DAL(with_metaclass(MetaDAL, Serializable, BasicStorage)):
             self._adapter = BaseAdapter(db=self,pool_size=0,
                                         uri='None',folder=folder,
                                         db_codec=db_codec, after_connection=after_connection,
-                                        entity_quoting=entity_quoting)
+                                        entity_quoting=entity_quoting,
+                                        param_style=param_style)
             migrate = fake_migrate = False
         adapter = self._adapter
         self._uri_hash = table_hash or hashlib_md5(adapter.uri).hexdigest()
@@ -936,6 +944,22 @@ class DAL(with_metaclass(MetaDAL, Serializable, BasicStorage)):
     def rollback(self):
         self._adapter.rollback()
 
+    def identity_map(self):
+        """
+        Enables the `IdentityMap` of the records fetched by id, and returns
+        it. Used in a `with` statement it is disabled at the end, unless it
+        was enabled before::
+
+            with db.identity_map():
+                for row in db(db.post).select():
+                    print row.author.name  # one select for each author
+        """
+        if self._identity_map is None:
+            self._identity_map = IdentityMap(self)
+        else:
+            self._identity_map.enabling = False
+        return self._identity_map
+
     def close(self):
         self._adapter.close()
         if self._db_uid in THREAD_LOCAL.db_instances:
@@ -1057,21 +1081,46 @@ class DAL(with_metaclass(MetaDAL, Serializable, BasicStorage)):
         return self.representers[name](*args, **kwargs)
 
     def export_to_csv_file(self, ofile, *args, **kwargs):
-        step = long(kwargs.get('max_fetch_rows,',500))
+        step = long(kwargs.pop('max_fetch_rows', self._adapter.fetch_size))
         write_colnames = kwargs['write_colnames'] = \
             kwargs.get("write_colnames", True)
         for table in self.tables:
             ofile.write('TABLE %s\r\n' % table)
-            query = self._adapter.id_query(self[table])
-            nrows = self(query).count()
             kwargs['write_colnames'] = write_colnames
-            for k in range(0,nrows,step):
-                self(query).select(limitby=(k,k+step)).export_to_csv_file(
-                    ofile, *args, **kwargs)
+            for rows in self._export_batches(self[table], step):
+                rows.export_to_csv_file(ofile, *args, **kwargs)
                 kwargs['write_colnames'] = False
             ofile.write('\r\n\r\n')
         ofile.write('END')
 
+    def _export_batches(self, table, step):
+        """
+        Yields the records of `table` in batches of `step` ordered by key,
+        each batch selected after the last key of the previous one (keyset
+        pagination) instead of skipping the previous records with OFFSET
+        """
+        query = self._adapter.id_query(table)
+        pkeys = getattr(table, '_primarykey', None)
+        if pkeys and len(pkeys) > 1:
+            # no single column to paginate on
+            k = 0
+            while True:
+                rows = self(query).select(limitby=(k, k + step))
+                if rows:
+                    yield rows
+                if len(rows) < step:
+                    return
+                k += step
+        key = table[pkeys[0]] if pkeys else table._id
+        rows = self(query).select(orderby=key, limitby=(0, step))
+        while rows:
+            yield rows
+            if len(rows) < step:
+                return
+            last = rows.last()[key.name]
+            rows = self(query & (key > last)).select(
+                orderby=key, limitby=(0, step))
+
     def import_from_csv_file(self, ifile, id_map=None, null='<NULL>',
                              unique='uuid', map_tablenames=None,
                              ignore_missing_tables=False,
@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+"""
+Cache models for the `cache=(cache_model, time_expire)` argument of
+`select` and `count`
+"""
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from .._compat import iteritems, string_types, pickle, hashlib_md5
+from .._load import OrderedDict, portalocker
+
+
+try:
+    _replace = os.replace
+except AttributeError:
+    def _replace(source, destination):
+        # os.rename fails on Windows if the destination exists
+        if os.name == 'nt' and os.path.exists(destination):
+            os.unlink(destination)
+        os.rename(source, destination)
+
+
+def sizeof(value):
+    """
+    Estimates the bytes of memory taken by `value` and by the containers,
+    strings and objects it holds
+    """
+    size = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value, 0)
+        if isinstance(value, string_types + (bytes,)):
+            continue
+        elif isinstance(value, dict):
+            for item in iteritems(value):
+                stack.extend(item)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+        elif hasattr(value, '__dict__'):
+            stack.append(value.__dict__)
+    return size
+
+
+class CacheInRam(object):
+    """
+    A thread-safe in-process cache model, bounded to `max_entries` values
+    taking (as estimated by `sizeof`) at most `max_bytes`: when storing a
+    value exceeds a bound, the least recently used values are evicted.
+
+    As with any cache model, `cache(key, f, time_expire)` returns the value
+    stored for `key` if younger than `time_expire` seconds (any age if
+    None), otherwise stores and returns `f()`; with `f=None` it removes the
+    value of `key`.
+
+    Example::
+
+        cache = CacheInRam(max_entries=1000, max_bytes=64 * 1024 * 1024)
+        rows = db(query).select(cache=(cache, 3600), cacheable=True)
+        cache.stats()
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None, sizeof=sizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.storage = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.locker = threading.RLock()
+
+    def __call__(self, key, f, time_expire=300):
+        if f is None:
+            self.locker.acquire()
+            try:
+                self._remove(key)
+            finally:
+                self.locker.release()
+            return None
+        self.locker.acquire()
+        try:
+            item = self.storage.get(key)
+            if item is not None:
+                if time_expire is None or item[0] > time.time() - time_expire:
+                    # most recently used go last
+                    del self.storage[key]
+                    self.storage[key] = item
+                    self.hits += 1
+                    return item[1]
+                self._remove(key)
+            self.misses += 1
+        finally:
+            self.locker.release()
+        value = f()
+        self.store(key, value)
+        return value
+
+    def store(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.locker.acquire()
+        try:
+            self._remove(key)
+            self.storage[key] = (time.time(), value, size)
+            self.bytes += size
+            while len(self.storage) > self.max_entries or \
+                    self.max_bytes is not None and self.bytes > self.max_bytes:
+                self._remove(next(iter(self.storage)))
+                self.evictions += 1
+        finally:
+            self.locker.release()
+
+    def _remove(self, key):
+        item = self.storage.pop(key, None)
+        if item is not None:
+            self.bytes -= item[2]
+
+    def clear(self, regex=None):
+        """
+        Removes all the values, or those whose key matches `regex`
+        """
+        self.locker.acquire()
+        try:
+            if regex is None:
+                self.storage.clear()
+                self.bytes = 0
+            else:
+                match = re.compile(regex).match
+                for key in [key for key in self.storage if match(key)]:
+                    self._remove(key)
+        finally:
+            self.locker.release()
+
+    def __len__(self):
+        return len(self.storage)
+
+    def __contains__(self, key):
+        return key in self.storage
+
+    def stats(self):
+        """
+        Returns the counters of the hits, misses and evictions and the size
+        of the cache (`bytes` is counted only when bounded by `max_bytes`)
+        """
+        self.locker.acquire()
+        try:
+            return dict(hits=self.hits, misses=self.misses,
+                        evictions=self.evictions, entries=len(self.storage),
+                        bytes=self.bytes)
+        finally:
+            self.locker.release()
+
+
+class CacheOnDisk(object):
+    """
+    A cache model shared by the processes (and threads) using the same
+    `folder`, bounded to `max_entries` values taking at most `max_bytes`
+    pickled: when storing a value exceeds a bound, the least recently used
+    values are evicted until the cache takes `evict_to` of its bounds. It
+    is called as `CacheInRam`.
+
+    Each value is a file of the folder, read without locking (the files
+    are written aside and replaced atomically, unreadable ones are misses)
+    and touched when used, with the time given by `clock`. The writes lock
+    the `index` file of the folder with `portalocker`, which counts the
+    values and their bytes: the folder is only listed to evict.
+
+    Example::
+
+        cache = CacheOnDisk('/var/cache/app/selects', max_bytes=2 ** 28)
+        rows = db(query).select(cache=(cache, 3600), cacheable=True)
+    """
+
+    #: fraction of the bounds the evictions go down to (so that the folder
+    #: is listed once in a while rather than on each store)
+    evict_to = 0.9
+
+    def __init__(self, folder, max_entries=1000, max_bytes=None,
+                 clock=time.time):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # made by another process
+                if not os.path.isdir(folder):
+                    raise
+        self.locker = threading.Lock()
+        self.index = os.fdopen(os.open(os.path.join(folder, 'index'),
+                                       os.O_RDWR | os.O_CREAT), 'r+b')
+
+    def filename(self, key):
+        return os.path.join(self.folder, hashlib_md5(key).hexdigest())
+
+    def __call__(self, key, f, time_expire=300):
+        filename = self.filename(key)
+        if f is None:
+            self.lock()
+            try:
+                size = self._remove(filename)
+                if size is not None:
+                    entries, size_ = self.read_index()
+                    self.write_index(entries - 1, size_ - size)
+            finally:
+                self.unlock()
+            return None
+        try:
+            stream = open(filename, 'rb')
+        except IOError:
+            stream = None
+        fresh = False
+        if stream is not None:
+            try:
+                created, stored_key = pickle.load(stream)
+                if stored_key == key and (
+                        time_expire is None or
+                        created > self.clock() - time_expire):
+                    value = pickle.load(stream)
+                    fresh = True
+            except Exception:
+                # truncated or corrupt, as a missing value
+                pass
+            finally:
+                stream.close()
+        if fresh:
+            try:
+                # the modification time orders the evictions
+                now = self.clock()
+                os.utime(filename, (now, now))
+            except OSError:
+                pass
+            return value
+        value = f()
+        self.store(key, value)
+        return value
+
+    def store(self, key, value):
+        now = self.clock()
+        data = pickle.dumps((now, key), pickle.HIGHEST_PROTOCOL) + \
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+        filename = self.filename(key)
+        self.lock()
+        try:
+            stream = open(filename + '.tmp', 'wb')
+            try:
+                stream.write(data)
+            finally:
+                stream.close()
+            os.utime(filename + '.tmp', (now, now))
+            try:
+                replaced = os.path.getsize(filename)
+            except OSError:
+                replaced = None
+            _replace(filename + '.tmp', filename)
+            entries, size = self.read_index()
+            if replaced is None:
+                entries += 1
+            size += len(data) - (replaced or 0)
+            if entries > self.max_entries or \
+                    self.max_bytes is not None and size > self.max_bytes:
+                entries, size = self._evict(filename)
+            self.write_index(entries, size)
+        finally:
+            self.unlock()
+
+    def entries(self):
+        """
+        Returns the list of the `(last use, bytes, filename)` of the values
+        """
+        entries = []
+        for name in os.listdir(self.folder):
+            if len(name) == 32:
+                filename = os.path.join(self.folder, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+        return entries
+
+    def _evict(self, keep):
+        # also recounts the values, in case others removed some files
+        entries = self.entries()
+        count = len(entries)
+        size = sum(entry[1] for entry in entries)
+        max_entries = int(self.max_entries * self.evict_to)
+        max_bytes = self.max_bytes is not None and \
+            int(self.max_bytes * self.evict_to)
+        for entry in sorted(entries):
+            if count <= max_entries and \
+                    (max_bytes is False or size <= max_bytes):
+                break
+            if entry[2] != keep:
+                self._remove(entry[2])
+                count -= 1
+                size -= entry[1]
+        return count, size
+
+    def _remove(self, filename):
+        """
+        Removes the file of a value, returns its size (None if missing)
+        """
+        try:
+            size = os.path.getsize(filename)
+            os.unlink(filename)
+        except OSError:
+            return None
+        return size
+
+    def read_index(self):
+        """
+        Returns the number of the values and their bytes
+        """
+        self.index.seek(0)
+        data = self.index.read(16)
+        if len(data) < 16:
+            return 0, 0
+        return struct.unpack('<QQ', data)
+
+    def write_index(self, entries, size):
+        self.index.seek(0)
+        self.index.write(struct.pack('<QQ', max(entries, 0), max(size, 0)))
+        self.index.flush()
+
+    def lock(self):
+        # the file lock is held by the process, the threads need their own
+        self.locker.acquire()
+        try:
+            portalocker.lock(self.index, portalocker.LOCK_EX)
+        except:
+            self.locker.release()
+            raise
+
+    def unlock(self):
+        portalocker.unlock(self.index)
+        self.locker.release()
+
+    def clear(self, regex=None):
+        """
+        Removes all the values, or those whose key matches `regex`
+        """
+        match = regex is not None and re.compile(regex).match
+        self.lock()
+        try:
+            entries = size = 0
+            for entry in self.entries():
+                filename = entry[2]
+                if match:
+                    try:
+                        stream = open(filename, 'rb')
+                        try:
+                            created, key = pickle.load(stream)
+                        finally:
+                            stream.close()
+                    except Exception:
+                        # unreadable, removed anyway
+                        key = None
+                    if key is not None and not match(key):
+                        entries += 1
+                        size += entry[1]
+                        continue
+                self._remove(filename)
+            self.write_index(entries, size)
+        finally:
+            self.unlock()
+
+    def __len__(self):
+        self.lock()
+        try:
+            return self.read_index()[0]
+        finally:
+            self.unlock()
+
+    def __contains__(self, key):
+        return os.path.exists(self.filename(key))
+
+    def close(self):
+        self.index.close()
+
+
+class _Missing(Exception):
+    pass
+
+
+class SingleFlight(object):
+    """
+    Wraps a cache `model` so that when a value is missing or expired only
+    one thread calls `f` to compute it again, while the others calling for
+    the same key wait for its result or, with `stale=True`, return the
+    expired value (if any) meanwhile.
+
+    The values are stored in `model` with their time (as given by `clock`),
+    under the keys prefixed by `flight/`, and expire in the wrapper (`model`
+    only evicts them). `f` is called outside of `model`, which is probed
+    (again by the thread about to call `f`, in case another flight just
+    stored the value) and stored into once, with its `store` method if
+    any::
+
+        cache = SingleFlight(CacheInRam(), stale=True)
+        rows = db(query).select(cache=(cache, 60), cacheable=True)
+        count = db(query).count(cache=(cache, 60))
+    """
+
+    def __init__(self, model, stale=False, clock=time.time):
+        self.model = model
+        self.stale = stale
+        self.clock = clock
+        self.flights = {}
+        self.locker = threading.Lock()
+
+    @staticmethod
+    def missing():
+        # makes the probe of a missing value store nothing
+        raise _Missing()
+
+    def __call__(self, key, f, time_expire=300):
+        key = 'flight/' + key
+        if f is None:
+            return self.model(key, None)
+        item = self.probe(key)
+        if item is None or time_expire is not None and \
+                item[0] <= self.clock() - time_expire:
+            item = self.flight(key, f, item)
+        return item[1]
+
+    def probe(self, key):
+        """
+        Returns the `(time, value)` stored for `key`, or None
+        """
+        try:
+            return self.model(key, self.missing, None)
+        except _Missing:
+            return None
+
+    def flight(self, key, f, expired=None):
+        """
+        Returns the `(time, f())` stored for `key` by the first caller, the
+        others wait for it (or return the `expired` item with `stale`)
+        """
+        self.locker.acquire()
+        try:
+            flight = self.flights.get(key)
+            if flight is None:
+                # event, item, exception
+                flight = self.flights[key] = [threading.Event(), None, None]
+                leader = True
+            else:
+                leader = False
+        finally:
+            self.locker.release()
+        if not leader:
+            if self.stale and expired is not None:
+                return expired
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1]
+        try:
+            # a flight may have stored it after the caller probed
+            item = self.probe(key)
+            if item is None or expired is not None and item[0] <= expired[0]:
+                item = (self.clock(), f())
+                # stored before the flight ends, so the next callers find it
+                store = getattr(self.model, 'store', None)
+                if store is not None:
+                    store(key, item)
+                else:
+                    # a negative expiration replaces the value
+                    self.model(key, lambda: item, -1)
+            flight[1] = item
+        except:
+            flight[2] = sys.exc_info()[1]
+            raise
+        finally:
+            self.locker.acquire()
+            try:
+                del self.flights[key]
+            finally:
+                self.locker.release()
+            flight[0].set()
+        return item
+
+
+class TableVersions(object):
+    """
+    Counters of the committed writes to each table: the cache keys of the
+    selects and counts include the versions of the tables they read, so a
+    write makes their cached values stale (see `BaseAdapter.versioned_key`).
+
+    The counters are kept in memory and shared by the adapters of the
+    process: the class attribute `BaseAdapter.table_versions`, or the
+    `table_versions` adapter argument, can be any object with the same
+    `get` and `bump` methods keeping them elsewhere.
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.locker = threading.Lock()
+
+    def get(self, keys):
+        """
+        Returns the list of the versions of `keys`
+        """
+        versions = self.versions
+        return [versions.get(key, 0) for key in keys]
+
+    def bump(self, keys):
+        """
+        Increments the versions of `keys`
+        """
+        self.locker.acquire()
+        try:
+            for key in keys:
+                self.versions[key] = self.versions.get(key, 0) + 1
+        finally:
+            self.locker.release()
+
+
+class RowCounters(object):
+    """
+    Counters of the records of the tables, used by `Set.count` with
+    `approximate=True` for the queries selecting a whole table: they are set
+    from an estimate (or a count) and kept up to date by the inserts and
+    deletes of the process, the writes of the others are accounted for when
+    they expire.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.locker = threading.Lock()
+
+    def get(self, key, time_expire=None):
+        """
+        Returns the counter of `key`, None if missing or older than
+        `time_expire` seconds
+        """
+        item = self.counters.get(key)
+        if item is None or time_expire is not None and \
+                item[0] < time.time() - time_expire:
+            return None
+        return item[1]
+
+    def set(self, key, count):
+        self.locker.acquire()
+        try:
+            self.counters[key] = (time.time(), count)
+        finally:
+            self.locker.release()
+
+    def add(self, key, delta):
+        """
+        Adds `delta` to the counter of `key`, if any
+        """
+        self.locker.acquire()
+        try:
+            item = self.counters.get(key)
+            if item is not None:
+                self.counters[key] = (item[0], max(item[1] + delta, 0))
+        finally:
+            self.locker.release()
+
+    def forget(self, keys):
+        self.locker.acquire()
+        try:
+            for key in keys:
+                self.counters.pop(key, None)
+        finally:
+            self.locker.release()
+
+
+class FileTableVersions(TableVersions):
+    """
+    `TableVersions` shared by the processes using the same `filename`: the
+    counters are kept in a file mapped in memory, made of `slots` slots of
+    8 bytes, each table using the slot of the hash of its key (the tables
+    sharing a slot are just invalidated together).
+
+    Create one for the process and pass it to the DAL instances::
+
+        versions = FileTableVersions('/var/run/app/versions')
+        db = DAL(uri, adapter_args={'table_versions': versions})
+    """
+
+    def __init__(self, filename, slots=4096):
+        self.filename = filename
+        self.slots = slots
+        self.locker = threading.Lock()
+        size = slots * 8
+        self.file = os.fdopen(os.open(filename, os.O_RDWR | os.O_CREAT), 'r+b')
+        portalocker.lock(self.file, portalocker.LOCK_EX)
+        try:
+            self.file.seek(0, 2)
+            if self.file.tell() < size:
+                self.file.write(b'\0' * (size - self.file.tell()))
+                self.file.flush()
+        finally:
+            portalocker.unlock(self.file)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    def offset(self, key):
+        return zlib.crc32(key.encode('utf8')) % self.slots * 8
+
+    def get(self, keys):
+        return [struct.unpack_from('<Q', self.map, self.offset(key))[0]
+                for key in keys]
+
+    def bump(self, keys):
+        offsets = set(self.offset(key) for key in keys)
+        # the file lock is held by the process, the threads need their own
+        self.locker.acquire()
+        try:
+            portalocker.lock(self.file, portalocker.LOCK_EX)
+            try:
+                for offset in offsets:
+                    (version,) = struct.unpack_from('<Q', self.map, offset)
+                    struct.pack_into('<Q', self.map, offset, version + 1)
+            finally:
+                portalocker.unlock(self.file)
+        finally:
+            self.locker.release()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
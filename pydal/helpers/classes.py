@@ -67,6 +67,69 @@ def Reference_pickler(data):
 copyreg.pickle(Reference, Reference_pickler, Reference_unpickler)
 
 
+class IdentityMap(object):
+    """
+    The records of the tables of `db` fetched by id (with `Table[id]`,
+    `Table(id)` and the references), returned again by the next lookups of
+    the same ids until their table is written or the transaction is rolled
+    back. See `DAL.identity_map`.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.tables = {}
+        # whether the next `with` block enabled the map, one for each block
+        self.enabling = True
+        self.blocks = []
+
+    def get(self, tablename, id, fetch):
+        """
+        Returns the record `id` of `tablename`, from `fetch()` the first time
+        """
+        records = self.tables.get(tablename)
+        if records is None:
+            records = self.tables[tablename] = {}
+        try:
+            return records[id]
+        except KeyError:
+            record = records[id] = fetch()
+            return record
+
+    def known(self, tablename, ids):
+        """
+        Returns a dict id -> record (None for missing ones) of the `ids` of
+        `tablename` already fetched
+        """
+        records = self.tables.get(tablename) or {}
+        return dict((id, records[id]) for id in ids if id in records)
+
+    def add(self, tablename, records):
+        """
+        Stores the `records` (a dict id -> record, None for missing ones) of
+        `tablename` fetched together
+        """
+        self.tables.setdefault(tablename, {}).update(records)
+
+    def forget(self, tablenames):
+        for tablename in tablenames:
+            self.tables.pop(tablename, None)
+
+    def clear(self):
+        self.tables.clear()
+
+    def __enter__(self):
+        self.blocks.append(self.enabling)
+        self.enabling = False
+        return self
+
+    def __exit__(self, *exc_info):
+        # a map enabled before the block stays enabled
+        if self.blocks.pop():
+            if self.db._identity_map is self:
+                self.db._identity_map = None
+            self.clear()
+
+
 class SQLCallableList(list):
     def __call__(self):
         return copy.copy(self)
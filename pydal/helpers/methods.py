@@ -2,7 +2,7 @@
 import uuid
 import re
 
-from .._compat import iteritems, integer_types
+from .._compat import iteritems, integer_types, xrange
 from .regex import REGEX_NOPASSWD, REGEX_UNPACK, REGEX_CONST_STRING, REGEX_W
 from .classes import SQLCustomType
 # from ..objects import Field, Table
@@ -245,8 +245,8 @@ def auto_validators(field):
     return field_validators
 
 
-def _fieldformat(r, id):
-    row = r(id)
+def _fieldformat(r, id, records=None):
+    row = r(id) if records is None else records.get(id)
     if not row:
         return str(id)
     elif hasattr(r, '_format') and isinstance(r._format, str):
@@ -258,11 +258,28 @@ def _fieldformat(r, id):
 
 
 class _repr_ref(object):
-    def __init__(self, ref=None):
+    def __init__(self, ref=None, records=None):
         self.ref = ref
+        self.records = records
 
     def __call__(self, value, row=None):
-        return value if value is None else _fieldformat(self.ref, value)
+        return value if value is None else \
+            _fieldformat(self.ref, value, self.records)
+
+    def prefetch(self, values):
+        """
+        Returns a copy of this representer formatting the referenced
+        records of `values` fetched all together, with one query for each
+        `adapter.belongs_size` ids
+        """
+        ids = list(set(value for value in values if value is not None))
+        records = {}
+        ref = self.ref
+        size = ref._db._adapter.belongs_size
+        for k in xrange(0, len(ids), size):
+            for row in ref._db(ref._id.belongs(ids[k:k + size])).select():
+                records[row[ref._id.name]] = row
+        return self.__class__(self.ref, records)
 
 
 class _repr_ref_list(_repr_ref):
@@ -271,7 +288,9 @@ class _repr_ref_list(_repr_ref):
             return None
         refs = None
         db, id = self.ref._db, self.ref._id
-        if db._adapter.dbengine == 'google:datastore':
+        if self.records is not None:
+            refs = [x for x in value if x in self.records]
+        elif db._adapter.dbengine == 'google:datastore':
             def count(values):
                 return db(id.belongs(values)).select(id)
             rx = range(0, len(value), 30)
@@ -280,7 +299,11 @@ class _repr_ref_list(_repr_ref):
         else:
             refs = db(id.belongs(value)).select(id)
         return refs and ', '.join(
-            _fieldformat(self.ref, x.id) for x in value) or ''
+            _fieldformat(self.ref, x, self.records) for x in value) or ''
+
+    def prefetch(self, values):
+        return _repr_ref.prefetch(
+            self, [x for value in values if value for x in value])
 
 
 def auto_represent(field):
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import array
 import base64
 import cgi
 import copy
@@ -13,7 +14,7 @@ import types
 
 from ._compat import PY2, StringIO, pjoin, exists, hashlib_md5, \
     integer_types, basestring, iteritems, xrange, implements_iterator, \
-    implements_bool, copyreg, reduce
+    implements_bool, copyreg, reduce, string_types, buffer_types
 from ._globals import DEFAULT, IDENTITY, AND, OR
 from ._gae import Key
 from .exceptions import NotFoundException, NotAuthorizedException
@@ -24,7 +25,7 @@ from .helpers.classes import Reference, MethodAdder, SQLCallableList, SQLALL, \
     Serializable, BasicStorage
 from .helpers.methods import list_represent, bar_decode_integer, \
     bar_decode_string, bar_encode, archive_record, cleanup, \
-    use_common_filters, pluralize
+    use_common_filters, pluralize, _repr_ref
 from .helpers.serializers import serializers
 
 long = integer_types[-1]
@@ -172,6 +173,268 @@ def pickle_row(s):
 copyreg.pickle(Row, pickle_row)
 
 
+class LazyRowAttribute(object):
+    """
+    Descriptor building an attribute of a `LazyRow` the first time it is
+    accessed, the value is then stored in the row like the other ones
+    """
+
+    def __init__(self, name, builder, type=None):
+        self.name = name
+        self.builder = builder
+        self.type = type
+
+    def __get__(self, row, owner=None):
+        if row is None:
+            return self
+        value = row.__dict__[self.name] = self.builder(row)
+        return value
+
+
+class LazyRow(Row):
+    """
+    A `Row` whose `update_record`, `delete_record` and referencing sets are
+    only built when accessed. Each table gets its own subclass, holding the
+    `LazyRowAttribute` descriptors, created by `LazyRow.subclass`.
+
+    The keys are the ones of a `Row`, in the same order: the lazy
+    attributes (built or not) follow the `anchor` key.
+    """
+
+    _lazy = {}
+    _lazy_names = ()
+    _anchor = None
+
+    @classmethod
+    def subclass(cls, attributes, anchor='id'):
+        lazy = dict((attribute.name, attribute) for attribute in attributes)
+        namespace = dict(lazy)
+        namespace['_lazy'] = lazy
+        namespace['_lazy_names'] = tuple(
+            attribute.name for attribute in attributes)
+        namespace['_anchor'] = anchor
+        return type('Row', (cls,), namespace)
+
+    def _keys(self, built=False):
+        # the lazy attributes are added to __dict__ as accessed: a dict
+        # filled in the order of a Row has its key order (unordered on py2)
+        lazy = self._lazy
+        keys = {}
+        for key in self.__dict__:
+            if key in lazy:
+                continue
+            keys[key] = None
+            if key == self._anchor:
+                for name in self._lazy_names:
+                    if not built or name in self.__dict__:
+                        keys[name] = None
+        return list(keys)
+
+    def keys(self):
+        return self._keys()
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    iterkeys = __iter__
+
+    def values(self):
+        return [self[key] for key in self._keys()]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def items(self):
+        return [(key, self[key]) for key in self._keys()]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def copy(self):
+        return dict(self.items())
+
+    def __getitem__(self, k):
+        key = str(k)
+        if key in self._lazy and not key in self.__dict__:
+            return getattr(self, key)
+        try:
+            return Row.__getitem__(self, k)
+        except KeyError:
+            if '__get_lazy_reference__' in self._lazy and \
+                    not '__get_lazy_reference__' in self.__dict__:
+                getattr(self, '__get_lazy_reference__')
+                return Row.__getitem__(self, k)
+            raise
+
+    __call__ = __getitem__
+
+    def __contains__(self, item):
+        return item in self.__dict__ or item in self._lazy
+
+    has_key = __contains__
+
+    def as_dict(self, datetime_to_str=False, custom_types=None):
+        types = custom_types
+        if not isinstance(types, (list, tuple, set)):
+            types = [types]
+        for name, attribute in iteritems(self._lazy):
+            if attribute.type in types and not name in self.__dict__:
+                getattr(self, name)
+        # the others would be left out anyway
+        built = Row()
+        for key in self._keys(built=True):
+            built[key] = self.__dict__[key]
+        return Row.as_dict(built, datetime_to_str, custom_types)
+
+    def __reduce__(self):
+        return Row, (dict((key, self.__dict__[key])
+                          for key in self._keys(built=True)),)
+
+
+class RowIndex(dict):
+    """
+    Maps the keys of the `CompactRow` objects of a select to the positions
+    of their values, or to the `RowIndex` of a table (or '_extra').
+    `names` are the keys as returned by `keys()`.
+
+    Once filled, `row(values)` builds the records: they are instances of a
+    `CompactRow` subclass, made on first use, with a property for each name.
+    """
+
+    def __init__(self, names=()):
+        dict.__init__(self)
+        self.names = list(names)
+        self.row_class = None
+
+    def __getstate__(self):
+        # the row class is rebuilt when needed
+        return dict(self.__dict__, row_class=None)
+
+    def row(self, values):
+        if self.row_class is None:
+            attributes = dict(__slots__=(), _index=self)
+            for name in self.names:
+                if not name.startswith('__'):
+                    attributes[name] = property(
+                        compact_getter(self[name]))
+            self.row_class = type('Row', (CompactRow,), attributes)
+        return self.row_class(values)
+
+
+def compact_getter(i):
+    if i.__class__ is int:
+        return lambda row: row._values[i]
+    return lambda row: i.row(row._values)
+
+
+def compact_row(index, values):
+    return index.row(values)
+
+
+@implements_bool
+class CompactRow(object):
+    """
+    A read-only record storing its values in a tuple, returned by
+    `select(..., rows_class='compact')`. The records of a select share the
+    same `RowIndex`, so a record has no `__dict__` of its own and `row.field`,
+    `row['table.field']` are just a lookup in the index and in the tuple.
+    The records of each table are views on the same tuple.
+
+    `as_row()` returns the equivalent (writable) `Row`.
+    """
+
+    __slots__ = ('_values',)
+
+    _index = RowIndex()
+
+    def __init__(self, values):
+        self._values = values
+
+    def __getitem__(self, k):
+        i = self._index[k if k.__class__ is str else str(k)]
+        if i.__class__ is int:
+            return self._values[i]
+        return i.row(self._values)
+
+    __call__ = __getitem__
+
+    def __getattr__(self, k):
+        if k.startswith('__') or k == '_values':
+            raise AttributeError(k)
+        try:
+            return self[k]
+        except KeyError:
+            raise AttributeError(k)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, item):
+        return item in self._index.names
+
+    has_key = __contains__
+
+    def __len__(self):
+        return len(self._index.names)
+
+    def __bool__(self):
+        return len(self._index.names) > 0
+
+    def __iter__(self):
+        return iter(self._index.names)
+
+    def keys(self):
+        return list(self._index.names)
+
+    def values(self):
+        return [self[k] for k in self._index.names]
+
+    def items(self):
+        return [(k, self[k]) for k in self._index.names]
+
+    def as_row(self):
+        row = Row()
+        for k in self._index.names:
+            v = self[k]
+            row[k] = v.as_row() if isinstance(v, CompactRow) else v
+        return row
+
+    def as_dict(self, datetime_to_str=False, custom_types=None):
+        return self.as_row().as_dict(datetime_to_str, custom_types)
+
+    def as_xml(self, row_name="row", colnames=None, indent='  '):
+        return self.as_row().as_xml(row_name, colnames, indent)
+
+    def as_json(self, mode="object", default=None, colnames=None,
+                serialize=True, **kwargs):
+        return self.as_row().as_json(mode, default, colnames, serialize,
+                                     **kwargs)
+
+    __str__ = __repr__ = lambda self: '<Row %s>' % self.as_dict()
+
+    __int__ = lambda self: self.get('id')
+
+    __long__ = lambda self: long(self.get('id'))
+
+    def __eq__(self, other):
+        try:
+            return self.as_dict() == other.as_dict()
+        except AttributeError:
+            return False
+
+    def __copy__(self):
+        return self.as_row()
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.as_row(), memo)
+
+    def __reduce__(self):
+        return compact_row, (self._index, self._values)
+
+
 class Table(Serializable, BasicStorage):
 
     """
@@ -493,14 +756,28 @@ class Table(Serializable, BasicStorage):
                     isinstance(key, Key)
             except:
                 isgoogle = False
-            if str(key).isdigit() or isgoogle:
+            if isgoogle:
                 return self._db(self._id == key).select(
                     limitby=(0, 1),
                     orderby_on_limitby=False
                 ).first()
+            elif str(key).isdigit():
+                return self._select_by_id(key)
             else:
                 return super(Table, self).__getitem__(key)
 
+    def _select_by_id(self, key, **attributes):
+        # from the identity map of the db, if any
+        def select():
+            return self._db(self._id == key).select(
+                limitby=(0, 1),
+                orderby_on_limitby=False,
+                **attributes).first()
+        identity_map = self._db._identity_map
+        if identity_map is None or attributes or self._ot is not None:
+            return select()
+        return identity_map.get(self._tablename, long(key), select)
+
     def __call__(self, key=DEFAULT, **kwargs):
         for_update = kwargs.get('_for_update', False)
         if '_for_update' in kwargs:
@@ -519,12 +796,14 @@ class Table(Serializable, BasicStorage):
                     orderby_on_limitby=False).first()
             elif not str(key).isdigit():
                 record = None
-            else:
+            elif for_update or orderby:
                 record = self._db(self._id == key).select(
                     limitby=(0,1),
                     for_update=for_update,
                     orderby=orderby,
                     orderby_on_limitby=False).first()
+            else:
+                record = self._select_by_id(key)
             if record:
                 for k,v in iteritems(kwargs):
                     if record[k]!=v: return None
@@ -1960,20 +2239,23 @@ class Set(Serializable):
     def isempty(self):
         return not self.select(limitby=(0,1), orderby_on_limitby=False)
 
-    def count(self,distinct=None, cache=None):
+    def count(self,distinct=None, cache=None, approximate=False):
         db = self.db
+        if approximate and not distinct:
+            return db._adapter.approximate_count(self.query)
         if cache:
             sql = self._count(distinct=distinct)
             if isinstance(cache,dict):
                 cache_model = cache['model']
                 time_expire = cache['expiration']
                 key = cache.get('key')
-                if not key:
-                    key = db._uri + '/' + sql
-                    key = hashlib_md5(key).hexdigest()
             else:
                 cache_model, time_expire = cache
-                key = db._uri + '/' + sql
+                key = None
+            if not key:
+                adapter = db._adapter
+                key = adapter.versioned_key(db._uri + '/' + sql,
+                                            adapter.tables(self.query))
                 key = hashlib_md5(key).hexdigest()
             return cache_model(
                 key,
@@ -1984,13 +2266,74 @@ class Set(Serializable):
 
     def select(self, *fields, **attributes):
         adapter = self.db._adapter
+        prefetch = attributes.pop('prefetch', None)
+        include = attributes.pop('include', None)
+        tablenames = adapter.tables(self.query,
+                                    attributes.get('join',None),
+                                    attributes.get('left',None),
+                                    attributes.get('orderby',None),
+                                    attributes.get('groupby',None))
+        fields = adapter.expand_all(fields, tablenames)
+        rows = adapter.select(self.query,fields,attributes)
+        if prefetch:
+            rows.prefetch(*prefetch)
+        if include:
+            rows.include(*include)
+        return rows
+
+    def select_arrays(self, *fields, **attributes):
+        """
+        Same as `select` but returns the columns as numpy arrays, in an
+        OrderedDict keyed by colname or, with `structured=True`, as a
+        structured array. Requires numpy.
+        """
+        adapter = self.db._adapter
+        structured = attributes.pop('structured', False)
+        def processor(rows, fields, colnames, cacheable=False):
+            return adapter.parse_arrays(rows, fields, colnames,
+                                        structured=structured)
+        attributes['processor'] = processor
+        return self.select(*fields, **attributes)
+
+    def select_json(self, *fields, **attributes):
+        """
+        Serializes the selected rows as JSON (like `Rows.as_json`) straight
+        from the cursor, without building `Row` objects.
+        Writes it to `ofile` if given, otherwise returns a generator of utf8
+        encoded chunks, one for each batch of `fetch_size` rows fetched.
+        With `compact=False` the records are always nested by table.
+        """
+        return self._select_chunks('json', fields, attributes)
+
+    def select_csv(self, *fields, **attributes):
+        """
+        Same as `select_json` but serializes as CSV, like
+        `Rows.export_to_csv_file` (with its `null`, `delimiter`, `quotechar`,
+        `quoting` and `write_colnames` arguments)
+        """
+        return self._select_chunks('csv', fields, attributes)
+
+    def _select_chunks(self, format, fields, attributes):
+        ofile = attributes.pop('ofile', None)
+        options = {}
+        for key in ('null', 'delimiter', 'quotechar', 'quoting',
+                    'write_colnames'):
+            if key in attributes:
+                options[key] = attributes.pop(key)
+        adapter = self.db._adapter
         tablenames = adapter.tables(self.query,
                                     attributes.get('join',None),
                                     attributes.get('left',None),
                                     attributes.get('orderby',None),
                                     attributes.get('groupby',None))
         fields = adapter.expand_all(fields, tablenames)
-        return adapter.select(self.query,fields,attributes)
+        chunks = adapter.select_chunks(self.query, fields, attributes, format,
+                                       **options)
+        if ofile is None:
+            return (chunk.encode('utf8') if not PY2 else chunk
+                    for chunk in chunks)
+        for chunk in chunks:
+            ofile.write(chunk)
 
     def iterselect(self, *fields, **attributes):
         adapter = self.db._adapter
@@ -2123,9 +2466,16 @@ class LazyReferenceGetter(object):
 
 
 class LazySet(object):
+    #: the Rows of the set when loaded by `Rows.include`
+    _rows = None
+
     def __init__(self, field, id):
         self.db, self.tablename, self.fieldname, self.id = \
             field.db, field._tablename, field.name, id
+    def _loaded(self):
+        rows = self._rows
+        return Rows(self.db, list(rows.records), rows.colnames,
+                    compact=rows.compact)
     def _getset(self):
         query = self.db[self.tablename][self.fieldname]==self.id
         return Set(self.db,query)
@@ -2142,20 +2492,30 @@ class LazySet(object):
     def _update(self, **update_fields):
         return self._getset()._update(**update_fields)
     def isempty(self):
+        if self._rows is not None:
+            return not self._rows.records
         return self._getset().isempty()
-    def count(self,distinct=None, cache=None):
-        return self._getset().count(distinct,cache)
+    def count(self,distinct=None, cache=None, approximate=False):
+        if self._rows is not None and not distinct and not cache:
+            return len(self._rows.records)
+        return self._getset().count(distinct,cache,approximate)
     def select(self, *fields, **attributes):
+        if self._rows is not None and not fields and not attributes:
+            return self._loaded()
         return self._getset().select(*fields,**attributes)
     def nested_select(self,*fields,**attributes):
         return self._getset().nested_select(*fields,**attributes)
     def delete(self):
+        self._rows = None
         return self._getset().delete()
     def update(self, **update_fields):
+        self._rows = None
         return self._getset().update(**update_fields)
     def update_naive(self, **update_fields):
+        self._rows = None
         return self._getset().update_naive(**update_fields)
     def validate_and_update(self, **update_fields):
+        self._rows = None
         return self._getset().validate_and_update(**update_fields)
     def delete_uploaded_files(self, upload_fields=None):
         return self._getset().delete_uploaded_files(upload_fields)
@@ -2169,6 +2529,29 @@ class VirtualCommand(object):
         return self.method(self.row,*args,**kwargs)
 
 
+def represent_takes_row(represent):
+    """
+    Tells if `represent` may use the row besides the value, that is unless
+    it is a reference representer or it can be called with the value only
+    """
+    if isinstance(represent, _repr_ref):
+        return False
+    function = getattr(represent, '__func__', represent)
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return True
+    args = code.co_argcount - len(function.__defaults__ or ())
+    if function is not represent:
+        args -= 1
+    return args != 1
+
+
+def blob_encode(value):
+    if not isinstance(value, bytes):
+        value = value.encode('utf8')
+    return base64.b64encode(value).decode('ascii')
+
+
 @implements_bool
 class BasicRows(object):
     """
@@ -2374,22 +2757,30 @@ class BasicRows(object):
                 return bar_encode(value)
             return value
 
+        # the table, field and Field of each column, resolved once
+        columns = []
+        for col in colnames:
+            m = self.db._adapter.REGEX_TABLE_DOT_FIELD.match(col)
+            if not m:
+                columns.append((None, col, None))
+            else:
+                (t, f) = m.groups()
+                columns.append((t, f, self.db[t][f]))
+
         repr_cache = {}
         for record in self:
             row = []
-            for col in colnames:
-                m = self.db._adapter.REGEX_TABLE_DOT_FIELD.match(col)
-                if not m:
-                    row.append(record._extra[col])
+            for (t, f, field) in columns:
+                if t is None:
+                    row.append(record._extra[f])
                 else:
-                    (t, f) = m.groups()
-                    field = self.db[t][f]
-                    if isinstance(record.get(t, None), (Row, dict)):
+                    if isinstance(record.get(t, None),
+                                  (Row, CompactRow, dict)):
                         value = record[t][f]
                     else:
                         value = record[f]
                     if field.type == 'blob' and value is not None:
-                        value = base64.b64encode(value)
+                        value = blob_encode(value)
                     elif represent and field.represent:
                         if field.type.startswith('reference'):
                             if field not in repr_cache:
@@ -2417,6 +2808,8 @@ class Rows(BasicRows):
 
     # ## TODO: this class still needs some work to care for ID/OID
 
+    _indexes = None
+
     def __init__(self, db=None, records=[], colnames=[], compact=True,
                  rawrows=None):
         self.db = db
@@ -2469,6 +2862,7 @@ class Rows(BasicRows):
                                 virtualfields.__dict__.update(row)
                                 updated = True
                             box[attribute] = method()
+        self._indexes = None
         return self
 
     def __and__(self, other):
@@ -2481,12 +2875,69 @@ class Rows(BasicRows):
     def __or__(self, other):
         if self.colnames != other.colnames:
             raise Exception('Cannot | incompatible Rows objects')
+        key = self._record_key()
+        keys = set(map(key, self.records))
         records = [record for record in other.records
-                   if record not in self.records]
+                   if not key(record) in keys]
         records = self.records + records
         return Rows(self.db, records, self.colnames,
                     compact=self.compact or other.compact)
 
+    def __sub__(self, other):
+        if self.colnames != other.colnames:
+            raise Exception('Cannot - incompatible Rows objects')
+        key = self._record_key()
+        keys = set(map(key, other.records))
+        records = [record for record in self.records
+                   if not key(record) in keys]
+        return Rows(self.db, records, self.colnames, compact=self.compact)
+
+    def intersection(self, other):
+        """
+        Returns the records also in `other` (`&` concatenates the Rows)
+        """
+        if self.colnames != other.colnames:
+            raise Exception('Cannot intersect incompatible Rows objects')
+        key = self._record_key()
+        keys = set(map(key, other.records))
+        records = [record for record in self.records if key(record) in keys]
+        return Rows(self.db, records, self.colnames, compact=self.compact)
+
+    union = __or__
+    difference = __sub__
+
+    def _record_key(self):
+        """
+        Returns the function giving the identity of a record for the set
+        operations: the ids of its tables if they are all selected (and
+        nothing else is), otherwise all its values
+        """
+        regex = self.db._adapter.REGEX_TABLE_DOT_FIELD if self.db \
+            else REGEX_TABLE_DOT_FIELD
+        columns = []
+        for colname in self.colnames:
+            m = regex.match(colname)
+            columns.append(m.groups() if m else ('_extra', colname))
+        tablenames = set(tablename for (tablename, fieldname) in columns)
+        ids = [(tablename, fieldname) for (tablename, fieldname) in columns
+               if self.db and tablename in self.db.tables and
+               self.db[tablename]._id.name == fieldname]
+        if len(ids) == len(tablenames):
+            columns = ids
+            def key(record):
+                return tuple(record[tablename][fieldname]
+                             for (tablename, fieldname) in columns)
+        else:
+            def key(record):
+                values = []
+                for (tablename, fieldname) in columns:
+                    value = record[tablename][fieldname]
+                    if isinstance(value, (list, dict, set)):
+                        value = repr(value)
+                    values.append(value)
+                return tuple(values)
+        return key
+
     def __len__(self):
         return len(self.records)
 
@@ -2558,16 +3009,126 @@ class Rows(BasicRows):
         if not self.records:
             return Rows(self.db, [], self.colnames, compact=self.compact)
         removed = []
-        i = 0
-        while i < len(self):
-            row = self[i]
+        kept = []
+        for record, row in zip(self.records, self):
             if f(row):
-                removed.append(self.records[i])
-                del self.records[i]
+                removed.append(record)
             else:
-                i += 1
+                kept.append(record)
+        self.records[:] = kept
+        self._indexes = None
         return Rows(self.db, removed, self.colnames, compact=self.compact)
 
+    def index_by(self, fields, rebuild=False):
+        """
+        Returns a `HashIndex` of the rows by the value of a field (or the
+        tuple of the values of a list of fields).
+        The index is a snapshot, kept and reused until `exclude` or
+        `setvirtualfields` change the rows: after changing `records` or the
+        values of the rows directly, get a new one with `rebuild=True`.
+
+        Example::
+
+            index = rows.index_by(db.person.name)
+            index.lookup('Max').id     # the first person named 'Max'
+            index['Max']               # the Rows of all of them
+        """
+        if not isinstance(fields, (list, tuple)):
+            fields = [fields]
+        key = tuple(str(field) for field in fields)
+        if self._indexes is None:
+            self._indexes = {}
+        index = self._indexes.get(key)
+        if index is None or rebuild:
+            index = self._indexes[key] = HashIndex(self, key)
+        return index
+
+    def lookup(self, value, by='id', default=None):
+        """
+        Returns the first row whose field `by` (a field or a list of fields,
+        with `value` a tuple) has `value`, or `default`
+        """
+        return self.index_by(by).lookup(value, default)
+
+    def prefetch(self, *fields):
+        """
+        Fetches the records referenced by the reference `fields` of the
+        rows, with one select for each referenced table (and each
+        `adapter.belongs_size` ids), and attaches them to the `Reference`
+        values so that their attributes need no further selects.
+        With `db.identity_map()` the records already there are not fetched
+        again, and the fetched ones (None for the missing ones) are added.
+        Used by `select(..., prefetch=[fields])`.
+        """
+        references = {}
+        for field in fields:
+            (tablename, name) = (field.tablename, field.name)
+            for record in self.records:
+                value = record[tablename][name]
+                if isinstance(value, Reference) and not value._record:
+                    references.setdefault(
+                        value._table._tablename, []).append(value)
+        size = self.db._adapter.belongs_size
+        identity_map = self.db._identity_map
+        for (tablename, values) in iteritems(references):
+            table = values[0]._table
+            ids = set(long(value) for value in values)
+            records = {}
+            if identity_map is not None:
+                records = identity_map.known(tablename, ids)
+            ids = [id for id in ids if not id in records]
+            fetched = dict.fromkeys(ids)
+            for k in xrange(0, len(ids), size):
+                for row in self.db(table._id.belongs(ids[k:k + size])).select():
+                    fetched[long(row[table._id.name])] = row
+            if identity_map is not None:
+                identity_map.add(tablename, fetched)
+            records.update(fetched)
+            for value in values:
+                value._record = records[long(value)]
+        return self
+
+    def include(self, *fields):
+        """
+        Fetches the records referencing the rows through the reference
+        `fields` (of other tables), with one select for each field (and
+        each `adapter.belongs_size` ids), and groups them in the `LazySet`
+        of each row: its `select()`, `count()` and `isempty()` without
+        arguments need no further selects.
+        Used by `select(..., include=[fields])`.
+        """
+        db = self.db
+        size = db._adapter.belongs_size
+        if not db._referee_name:
+            raise RuntimeError('include needs the referencing sets')
+        for field in fields:
+            referenced = db[field.type[10:].strip()]
+            tablename = referenced._tablename
+            referee_link = db._referee_name % dict(
+                table=field.tablename, field=field.name)
+            parents = [record[tablename] for record in self.records]
+            ids = list(set(long(parent[referenced._id.name])
+                           for parent in parents))
+            groups = {}
+            children = None
+            for k in xrange(0, len(ids), size):
+                children = db(field.belongs(ids[k:k + size])).select(
+                    orderby=field.table._id)
+                for record in children.records:
+                    groups.setdefault(long(record[field.tablename][
+                        field.name]), []).append(record)
+            if children is None:
+                continue
+            for parent in parents:
+                lazyset = parent.get(referee_link)
+                if not isinstance(lazyset, LazySet):
+                    lazyset = parent[referee_link] = LazySet(
+                        field, parent[referenced._id.name])
+                lazyset._rows = Rows(
+                    db, groups.get(long(parent[referenced._id.name]), []),
+                    children.colnames)
+        return self
+
     def sort(self, f, reverse=False):
         """
         Returns a list of sorted elements (not sorted in place)
@@ -2633,6 +3194,20 @@ class Rows(BasicRows):
 
         return grouped_row_group
 
+    def as_numpy(self, structured=False):
+        """
+        Returns the columns as numpy arrays, like `Set.select_arrays`
+        """
+        adapter = self.db._adapter
+        columns = [self.column(colname) for colname in self.colnames]
+        field_types = []
+        for (colname, column) in zip(self.colnames, columns):
+            m = adapter.REGEX_TABLE_DOT_FIELD.match(colname)
+            field_types.append(m and self.db[m.group(1)][m.group(2)].type or
+                               adapter.numpy_field_type(column))
+        return adapter.numpy_arrays(columns, self.colnames, field_types,
+                                    structured)
+
     def render(self, i=None, fields=None):
         """
         Takes an index and returns a copy of the indexed row with values
@@ -2643,56 +3218,499 @@ class Rows(BasicRows):
                 over all the rows.
             fields: a list of fields to transform (if None, all fields with
                 "represent" attributes will be transformed)
+
+        The records referenced by the rendered rows are fetched with one
+        query per reference field, and the representation of each value is
+        computed once for the fields whose represent does not take the row.
         """
         if i is None:
-            return (self.render(i, fields=fields) for i in range(len(self)))
+            return self._render(range(len(self)), fields)
+        return next(self._render([i], fields))
+
+    def _render(self, indexes, fields):
         if not self.db.has_representer('rows_render'):
             raise RuntimeError("Rows.render() needs a `rows_render` \
                                representer in DAL instance")
-        row = copy.deepcopy(self.records[i])
-        keys = list(row.keys())
+        db = self.db
+        records = [self.records[i] for i in indexes]
+        if not records:
+            return
+        keys = list(records[0].keys())
         tables = [f.tablename for f in fields] if fields \
             else [k for k in keys if k != '_extra']
-        for table in tables:
+        columns = []
+        for table in sorted(set(tables), key=tables.index):
             repr_fields = [f.name for f in fields if f.tablename == table] \
-                if fields else [k for k in row[table].keys()
-                                if (hasattr(self.db[table], k) and
-                                    isinstance(self.db[table][k], Field)
-                                    and self.db[table][k].represent)]
-            for field in repr_fields:
-                row[table][field] = self.db.represent(
-                    'rows_render', self.db[table][field], row[table][field],
-                    row[table])
+                if fields else [k for k in records[0][table].keys()
+                                if (hasattr(db[table], k) and
+                                    isinstance(db[table][k], Field)
+                                    and db[table][k].represent)]
+            for name in repr_fields:
+                field = db[table][name]
+                if isinstance(field.represent, _repr_ref):
+                    field = copy.copy(field)
+                    field.represent = field.represent.prefetch(
+                        record[table][name] for record in records)
+                memo = None if represent_takes_row(field.represent) else {}
+                columns.append((table, name, field, memo))
+        for record in records:
+            if isinstance(record, CompactRow):
+                row = record.as_row()
+            else:
+                row = record.__class__(record.__dict__)
+                for table in set(column[0] for column in columns):
+                    row[table] = row[table].__class__(row[table].__dict__)
+            for (table, name, field, memo) in columns:
+                value = row[table][name]
+                try:
+                    row[table][name] = memo[value]
+                    continue
+                except (KeyError, TypeError):
+                    pass
+                represented = db.represent('rows_render', field, value,
+                                           row[table])
+                if memo is not None:
+                    try:
+                        memo[value] = represented
+                    except TypeError:
+                        pass
+                row[table][name] = represented
+            if self.compact and len(keys) == 1 and keys[0] != '_extra':
+                yield row[keys[0]]
+            else:
+                yield row
+
+
+class HashIndex(object):
+    """
+    The records of a `Rows` grouped by the values of `fieldnames` (the
+    tuple of the values if more than one), returned by `Rows.index_by`
+    """
+
+    def __init__(self, rows, fieldnames):
+        self.rows = rows
+        self.fieldnames = fieldnames
+        self.groups = groups = {}
+        if len(fieldnames) == 1:
+            key = fieldnames[0]
+            for i, row in enumerate(rows):
+                groups.setdefault(row[key], []).append(i)
+        else:
+            for i, row in enumerate(rows):
+                groups.setdefault(
+                    tuple(row[key] for key in fieldnames), []).append(i)
+
+    def lookup(self, value, default=None):
+        """
+        Returns the first row with `value`, or `default`
+        """
+        positions = self.groups.get(value)
+        if not positions:
+            return default
+        return self.rows[positions[0]]
+
+    def __getitem__(self, value):
+        """
+        Returns the Rows with `value` (possibly empty)
+        """
+        rows = self.rows
+        records = rows.records
+        return Rows(rows.db, [records[i] for i in self.groups.get(value, ())],
+                    rows.colnames, compact=rows.compact)
+
+    def __contains__(self, value):
+        return value in self.groups
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def keys(self):
+        return list(self.groups.keys())
+
+    def items(self):
+        return [(value, self[value]) for value in self.groups]
+
+
+class ColumnarRows(Rows):
+    """
+    A `Rows` storing the values of each column in a list, returned by
+    `select(..., rows_class='columnar')`.
+    `Row` objects are built only for the records actually accessed, while
+    `len()`, `first()`, `last()` and `column()` work on the columns. Any
+    access to `records` builds all of them and turns it into a plain `Rows`.
+    """
+
+    def __init__(self, db=None, columns=[], colnames=[], row_builder=None,
+                 compact=True):
+        self.db = db
+        self.columns = columns
+        self.colnames = colnames
+        self.compact = compact
+        self.response = None
+        self._row_builder = row_builder
+        self._records = None
+
+    def _get_records(self):
+        if self.columns is not None:
+            self._records = [self._record(i) for i in xrange(len(self))]
+            self.columns = None
+        return self._records
+
+    def _set_records(self, records):
+        self.columns = None
+        self._records = records
+
+    records = property(_get_records, _set_records)
+
+    def _record(self, i):
+        records = self._records
+        if records is None:
+            records = self._records = [None] * len(self)
+        row = records[i]
+        if row is None:
+            row = records[i] = self._row_builder(
+                [column[i] for column in self.columns])
+        return row
 
+    def __getstate__(self):
+        # the row builder can't be pickled
+        self._get_records()
+        state = dict(self.__dict__)
+        state['_row_builder'] = None
+        return state
+
+    def __repr__(self):
+        return '<Rows (%s)>' % len(self)
+
+    def __len__(self):
+        if self.columns is None:
+            return len(self._records)
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getslice__(self, a, b):
+        return self.__getitem__(slice(a, b))
+
+    def __getitem__(self, i):
+        if self.columns is None:
+            return Rows.__getitem__(self, i)
+        if isinstance(i, slice):
+            return ColumnarRows(self.db, [column[i] for column in self.columns],
+                                self.colnames, self._row_builder,
+                                self.compact)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('list index out of range')
+        row = self._record(i)
+        keys = list(row.keys())
         if self.compact and len(keys) == 1 and keys[0] != '_extra':
             return row[keys[0]]
         return row
 
+    def column(self, column=None):
+        colname = str(column) if column else self.colnames[0]
+        if self.columns is None or not colname in self.colnames:
+            return Rows.column(self, column)
+        return list(self.columns[self.colnames.index(colname)])
+
+    def first(self):
+        if not len(self):
+            return None
+        return self[0]
+
+    def last(self):
+        if not len(self):
+            return None
+        return self[-1]
+
+
+class RowsSerializer(object):
+    """
+    Serializes the rows of a select, as fetched from the cursor, to JSON
+    (the same objects as `Rows.as_json`) or CSV (as `Rows.export_to_csv_file`)
+    without building `Row` objects: the parsing and encoding of each column
+    and the layout of the records are resolved once.
+
+    `layout` is the list of the items of a record: `(name, j)` for the value
+    of the j-th column or `(name, [(key, j), ...])` for a table (or
+    '_extra'), unless `flat` when it is just the list of the `(key, j)`.
+    `extras` are the indexes of the columns that are not table fields.
+    """
+
+    def __init__(self, colnames, field_types, parsers, layout, flat=False,
+                 extras=()):
+        self.colnames = colnames
+        self.field_types = field_types
+        self.parsers = parsers
+        self.layout = layout
+        self.flat = flat
+        self.extras = frozenset(extras)
+
+    def encoders(self, encode, extras=True):
+        # (j, function) for the columns whose values need some work
+        encoders = []
+        for (j, parser) in enumerate(self.parsers):
+            if extras or not j in self.extras:
+                encoder = encode(self.field_types[j])
+            else:
+                encoder = None
+            if parser and encoder:
+                encoder = (lambda parser, encoder: lambda value: \
+                    encoder(parser(value)))(parser, encoder)
+            elif parser:
+                encoder = parser
+            if encoder:
+                encoders.append((j, encoder))
+        return encoders
+
+    def values(self, rows, encoders):
+        if not encoders:
+            return rows
+        def convert(row):
+            row = list(row)
+            for (j, encoder) in encoders:
+                row[j] = encoder(row[j])
+            return row
+        return map(convert, rows)
+
+    def json_encoder(self, field_type):
+        if field_type in ('date', 'datetime', 'time'):
+            return lambda value: value if value is None else \
+                value.isoformat()[:19].replace('T', ' ')
+        elif isinstance(field_type, str) and field_type.startswith('decimal'):
+            return lambda value: value if value is None else float(value)
+        return None
+
+    def record_builder(self):
+        if self.flat:
+            keys = [key for (key, j) in self.layout]
+            positions = [j for (key, j) in self.layout]
+            if positions == list(range(len(self.parsers))):
+                return lambda values: dict(zip(keys, values))
+            return lambda values: dict(zip(keys, [values[j] for j in positions]))
+        def build(values):
+            record = {}
+            for (name, item) in self.layout:
+                if isinstance(item, list):
+                    record[name] = dict((key, values[j]) for (key, j) in item)
+                else:
+                    record[name] = values[item]
+            return record
+        return build
+
+    def json_chunks(self, batches):
+        """
+        Yields the JSON list of the records, a chunk for each batch of rows
+        """
+        encoders = self.encoders(self.json_encoder)
+        build = self.record_builder()
+        yield '['
+        separator = ''
+        for rows in batches:
+            records = list(map(build, self.values(rows, encoders)))
+            if records:
+                yield separator + serializers.json(records)[1:-1]
+                separator = ','
+        yield ']'
+
+    def csv_chunks(self, batches, null='<NULL>', delimiter=',', quotechar='"',
+                   quoting=csv.QUOTE_MINIMAL, write_colnames=True):
+        """
+        Yields the CSV of the rows (first the column names), a chunk for
+        each batch of rows
+        """
+        def csv_encoder(field_type):
+            if field_type == 'blob':
+                return lambda value: null if value is None else \
+                    blob_encode(value)
+            def encode(value):
+                if value is None:
+                    return null
+                elif PY2 and isinstance(value, unicode):
+                    return value.encode('utf8')
+                elif isinstance(value, Reference):
+                    return long(value)
+                elif hasattr(value, 'isoformat'):
+                    return value.isoformat()[:19].replace('T', ' ')
+                elif isinstance(value, (list, tuple)):
+                    return bar_encode(value)
+                return value
+            return encode
+        # as export_to_csv_file, the values of the expressions are written
+        # as they are
+        encoders = self.encoders(csv_encoder, extras=False)
+        buffer = StringIO()
+        writer = csv.writer(buffer, delimiter=delimiter,
+                            quotechar=quotechar, quoting=quoting)
+        if write_colnames:
+            writer.writerow(self.colnames)
+        for rows in batches:
+            writer.writerows(self.values(rows, encoders))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+class PackedRows(object):
+    """
+    The rows fetched by a select packed by column, the form in which
+    `select(cache=..., cacheable=True)` stores them: smaller and faster
+    to pickle than a `Rows`.
+
+    `columns` has a `(kind, data, nulls)` for each column: `'q'` and `'d'`
+    are integers and floats stored as the bytes of an `array` (`nulls` are
+    the positions of the None values), `'dict'` are repeated values stored
+    once with the array of their codes, `'list'` are the values as they are.
+    """
+
+    #: types of the values stored once when repeated
+    dictionary_types = frozenset(string_types + integer_types + (bytes,))
+
+    def __init__(self, rows, colnames):
+        self.colnames = colnames
+        self.length = len(rows)
+        self.columns = [self.pack(list(column)) for column in zip(*rows)]
+
+    @staticmethod
+    def pack(values):
+        nulls = [j for (j, value) in enumerate(values) if value is None]
+        kinds = set(type(value) for value in values)
+        kinds.discard(type(None))
+        if kinds and kinds <= set(integer_types) or kinds == set([float]):
+            kind = 'd' if float in kinds else 'q'
+            filled = [0 if value is None else value for value in values] \
+                if nulls else values
+            try:
+                data = array.array(kind, filled)
+            except (OverflowError, ValueError):
+                pass
+            else:
+                return (kind, data.tostring() if PY2 else data.tobytes(),
+                        nulls)
+        if kinds.intersection(buffer_types):
+            # buffers of the driver can't be pickled
+            values = [PackedRows.to_bytes(value)
+                      if isinstance(value, buffer_types) else value
+                      for value in values]
+        elif len(kinds) <= 1 and kinds <= PackedRows.dictionary_types:
+            # values of one type whose equal values are the same (unlike
+            # Decimal('1.0') and Decimal('1.00'), or datetimes in different
+            # time zones) with repetitions
+            codes = {}
+            try:
+                for value in values:
+                    codes.setdefault(value, len(codes))
+            except TypeError:
+                codes = None
+            if codes is not None and len(codes) * 2 <= len(values):
+                typecode = 'B' if len(codes) <= 0x100 else \
+                    'H' if len(codes) <= 0x10000 else 'I'
+                dictionary = [None] * len(codes)
+                for (value, code) in iteritems(codes):
+                    dictionary[code] = value
+                data = array.array(typecode, [codes[v] for v in values])
+                data = data.tostring() if PY2 else data.tobytes()
+                return ('dict', (dictionary, typecode, data), None)
+        return ('list', values, None)
+
+    @staticmethod
+    def to_bytes(value):
+        # str() of a memoryview is not its content on python 2
+        tobytes = getattr(value, 'tobytes', None)
+        return tobytes() if tobytes is not None else bytes(value)
+
+    @staticmethod
+    def unpack(kind, data, nulls):
+        if kind == 'list':
+            return data
+        elif kind == 'dict':
+            (dictionary, typecode, data) = data
+            codes = array.array(typecode)
+            (codes.fromstring if PY2 else codes.frombytes)(data)
+            return [dictionary[code] for code in codes]
+        values = array.array(kind)
+        (values.fromstring if PY2 else values.frombytes)(data)
+        values = values.tolist()
+        for j in nulls:
+            values[j] = None
+        return values
+
+    def rows(self):
+        """
+        Returns the list of the rows as tuples
+        """
+        return list(zip(*[self.unpack(*column) for column in self.columns]))
+
 
 @implements_iterator
 class IterRows(BasicRows):
-    def __init__(self, db, sql, fields, colnames, blob_decode, cacheable):
+    def __init__(self, db, sql, fields, colnames, blob_decode, cacheable,
+                 params=None, fetch_size=None):
         self.db = db
         self.fields = fields
         self.colnames = colnames
         self.blob_decode = blob_decode
         self.cacheable = cacheable
-        (self.fields_virtual, self.fields_lazy, self.tmps) = \
-            self.db._adapter._parse_expand_colnames(colnames)
-        self.db._adapter.execute(sql)
+        self.fetch_size = fetch_size or db._adapter.fetch_size
+        self.parse_row = self.db._adapter.row_parser(
+            colnames, fields, blob_decode, cacheable)
+        self.cursor = self.db._adapter.iter_cursor(sql, params)
+        # the rows of the last fetchmany and the position of the next one
+        self._batch = []
+        self._position = 0
         self._head = None
         self.last_item = None
         self.last_item_id = None
         self.compact = True
 
+    def _fetch(self):
+        """
+        Fetches the next batch of rows, returns False once they are over
+        """
+        if self.cursor is None:
+            return False
+        self._batch = self.db._adapter._fetchmany(self.fetch_size,
+                                                  self.cursor)
+        self._position = 0
+        if not self._batch:
+            self.close()
+            return False
+        return True
+
+    def _skip(self, n):
+        while n > 0:
+            if self._position == len(self._batch) and not self._fetch():
+                return
+            skipped = min(n, len(self._batch) - self._position)
+            self._position += skipped
+            n -= skipped
+
+    def close(self):
+        """
+        Releases the cursor if it isn't the adapter one (server-side cursors)
+        """
+        cursor, self.cursor = self.cursor, None
+        if cursor is not None:
+            self.db._adapter.close_iter_cursor(cursor)
+
+    def __del__(self):
+        if getattr(self, 'cursor', None) is not None:
+            try:
+                self.close()
+            except Exception:
+                pass
+
     def __next__(self):
-        db_row = self.db._adapter._fetchone()
-        if db_row is None:
+        if self._position == len(self._batch) and not self._fetch():
             raise StopIteration
-        row = self.db._adapter._parse(db_row, self.tmps, self.fields,
-                                      self.colnames, self.blob_decode,
-                                      self.cacheable, self.fields_virtual,
-                                      self.fields_lazy)
+        db_row = self._batch[self._position]
+        self._position += 1
+        row = self.parse_row(db_row)
         if self.compact:
             # The following is to translate
             # <Row {'t0': {'id': 1L, 'name': 'web2py'}}>
@@ -2705,13 +3723,18 @@ class IterRows(BasicRows):
         return row
 
     def __iter__(self):
-        if self._head:
-            yield self._head
-        row = next(self)
-        while row is not None:
-            yield row
-            row = next(self)
-        return
+        try:
+            if self._head:
+                yield self._head
+            while True:
+                try:
+                    row = next(self)
+                except StopIteration:
+                    return
+                yield row
+        finally:
+            # a loop may stop early
+            self.close()
 
     def first(self):
         if self._head is None:
@@ -2737,15 +3760,14 @@ class IterRows(BasicRows):
                 raise IndexError
 
         # fetch and drop the first key - 1 elements
-        for i in xrange(n_to_drop):
-            self.db._adapter._fetchone()
-        row = next(self)
-        if row is None:
+        self._skip(n_to_drop)
+        try:
+            row = next(self)
+        except StopIteration:
             raise IndexError
-        else:
-            self.last_item_id = key
-            self.last_item = row
-            return row
+        self.last_item_id = key
+        self.last_item = row
+        return row
 
 #    # rowcount it doesn't seem to be reliable on all drivers
 #    def __len__(self):
@@ -7,5 +7,6 @@ else:
     from .base import *
 
 from .validation import *
-from .caching import TestCache
+from .caching import TestCache, TestCacheInRam, TestCacheOnDisk, \
+    TestSingleFlight, TestFileTableVersions
 from .smart_query import *
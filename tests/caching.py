@@ -1,7 +1,19 @@
 import time
+import os
+import pickle
+import datetime
+import decimal
+import shutil
+import tempfile
+import multiprocessing
+import itertools
+import threading
 from pydal import DAL, Field
+from pydal.objects import Rows, ColumnarRows, PackedRows
+from pydal.helpers.cache import CacheInRam, CacheOnDisk, FileTableVersions, \
+    SingleFlight, sizeof
 from ._compat import unittest
-from ._adapt import DEFAULT_URI, IS_IMAP, drop
+from ._adapt import DEFAULT_URI, IS_IMAP, IS_SQLITE, drop
 
 
 class SimpleCache(object):
@@ -28,6 +40,23 @@ class SimpleCache(object):
         return value
 
 
+def insert_in_process(folder):
+    versions = FileTableVersions(os.path.join(folder, 'versions'))
+    db = DAL('sqlite://storage.sqlite', folder=folder,
+             adapter_args={'table_versions': versions})
+    db.define_table('tt', Field('aa'), migrate=False)
+    db.tt.insert(aa='2')
+    db.commit()
+    db.close()
+    versions.close()
+
+
+def store_in_process(folder):
+    cache = CacheOnDisk(folder)
+    cache('key', lambda: os.getpid(), None)
+    cache.close()
+
+
 @unittest.skipIf(IS_IMAP, "TODO: IMAP test")
 class TestCache(unittest.TestCase):
     def testRun(self):
@@ -45,3 +74,360 @@ class TestCache(unittest.TestCase):
         r4 = db().select(db.tt.ALL, cache=(cache, 1000), cacheable=True)
         self.assertEqual(len(r0), len(r4))
         drop(db.tt)
+
+    def testPacked(self):
+        cache = SimpleCache()
+        cache.clear()
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'),
+                        Field('cc', 'double'), Field('dd', 'date'),
+                        Field('ee', 'list:string'), Field('ff', 'boolean'))
+        for k in range(20):
+            db.tt.insert(aa='x%d' % (k % 3), bb=k if k % 4 else None,
+                         cc=k / 2.0, dd=datetime.date(2015, 1, k + 1),
+                         ee=['a', str(k)], ff=k % 2 == 0)
+        r0 = db(db.tt).select(orderby=db.tt.id)
+        r1 = db(db.tt).select(orderby=db.tt.id, cache=(cache, 1000),
+                              cacheable=True)
+        self.assertEqual(len(cache.storage), 1)
+        packed = list(cache.storage.values())[0][1]
+        self.assertIsInstance(packed, PackedRows)
+        packed = pickle.loads(pickle.dumps(packed, 2))
+        self.assertEqual(packed.rows(), [tuple(r) for r in r0.response])
+        r2 = db(db.tt).select(orderby=db.tt.id, cache=(cache, 1000),
+                              cacheable=True)
+        self.assertEqual(r1.as_list(), r0.as_list())
+        self.assertEqual(r2.as_list(), r0.as_list())
+        self.assertEqual(r2[5].bb, 5)
+        self.assertEqual(r2[4].bb, None)
+        self.assertEqual(type(r2), Rows)
+        self.assertEqual(r2.response, r0.response)
+        r2 = db(db.tt).select(orderby=db.tt.id, cache=(cache, 1000),
+                              cacheable=True, rows_class='columnar')
+        self.assertIsInstance(r2, ColumnarRows)
+        self.assertEqual(r2.as_list(), r0.as_list())
+        r3 = db(db.tt.id < 0).select(cache=(cache, 1000), cacheable=True)
+        self.assertEqual(len(r3), 0)
+        self.assertEqual(len(cache.storage), 2)
+        # only the values equal when the same are stored once
+        values = [decimal.Decimal('1.0'), decimal.Decimal('1.00')] * 2
+        self.assertEqual(PackedRows.pack(values)[0], 'list')
+        self.assertEqual(PackedRows.pack(['a', 'b'] * 2)[0], 'dict')
+        self.assertEqual(PackedRows.pack([memoryview(b'ab'), None]),
+                         ('list', [b'ab', None], None))
+        packed = PackedRows([(value,) for value in values], ['x'])
+        self.assertEqual([str(row[0]) for row in packed.rows()],
+                         ['1.0', '1.00', '1.0', '1.00'])
+        drop(db.tt)
+
+    def testInvalidation(self):
+        cache = SimpleCache()
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'))
+        db.define_table('tu', Field('tt_id', 'reference tt'))
+        def select(cacheable):
+            return [r.aa for r in db(db.tt).select(
+                db.tt.aa, orderby=db.tt.aa, cache=(cache, 1000),
+                cacheable=cacheable)]
+        count = lambda: db(db.tt).count(cache=(cache, 1000))
+        for cacheable in (False, True):
+            db.tt.insert(aa='1')
+            self.assertEqual(select(cacheable), ['1'])
+            self.assertEqual(count(), 1)
+            db.tt.insert(aa='2')
+            self.assertEqual(select(cacheable), ['1', '2'])
+            self.assertEqual(count(), 2)
+            db(db.tt.aa == '1').update(aa='3')
+            self.assertEqual(select(cacheable), ['2', '3'])
+            db(db.tt.aa == '2').delete()
+            self.assertEqual(select(cacheable), ['3'])
+            self.assertEqual(count(), 1)
+            db.tt.truncate()
+            self.assertEqual(select(cacheable), [])
+            self.assertEqual(count(), 0)
+        db.tt.insert(aa='1')
+        alias = db.tt.with_alias('other')
+        joined = lambda: len(db(db.tu.tt_id == alias.id).select(
+            cache=(cache, 1000), cacheable=True))
+        self.assertEqual(joined(), 0)
+        db.tu.insert(tt_id=1)
+        self.assertEqual(joined(), 1)
+        db(db.tt).delete()
+        self.assertEqual(joined(), 0)
+        # the tables written are bumped again at the end of the transaction
+        key = db._adapter.versioned_key('', ['tt'])
+        db.commit()
+        self.assertNotEqual(db._adapter.versioned_key('', ['tt']), key)
+        self.assertEqual(db._adapter.versioned_key('', ['tu']),
+                         db._adapter.versioned_key('', ['tu']))
+        drop(db.tu)
+        drop(db.tt)
+
+
+class TestCacheInRam(unittest.TestCase):
+
+    def testBounds(self):
+        cache = CacheInRam(max_entries=3)
+        for k in range(4):
+            self.assertEqual(cache(str(k), lambda: k), k)
+        self.assertEqual(cache('1', lambda: None), 1)
+        self.assertEqual(cache('4', lambda: 4), 4)
+        self.assertEqual(sorted(cache.storage), ['1', '3', '4'])
+        self.assertEqual(cache.stats(), dict(hits=1, misses=5, evictions=2,
+                                             entries=3, bytes=0))
+        cache('3', None)
+        self.assertNotIn('3', cache)
+        value = 'x' * 1000
+        cache = CacheInRam(max_bytes=sizeof(value) * 2)
+        cache('a', lambda: value)
+        cache('b', lambda: value + 'y')
+        self.assertEqual(list(cache.storage), ['b'])
+        self.assertEqual(cache.stats()['bytes'], sizeof(value + 'y'))
+        cache('c', lambda: value * 3)
+        self.assertNotIn('c', cache)
+        cache.clear('b')
+        self.assertEqual(len(cache), 0)
+
+    def testExpiration(self):
+        cache = CacheInRam()
+        self.assertEqual(cache('a', lambda: 1, 100), 1)
+        self.assertEqual(cache('a', lambda: 2, 100), 1)
+        self.assertEqual(cache('a', lambda: 3, None), 1)
+        self.assertEqual(cache('a', lambda: 4, -1), 4)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def testSelect(self):
+        cache = CacheInRam(max_entries=10, max_bytes=10 ** 6)
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'))
+        db.tt.insert(aa='1')
+        for k in range(3):
+            self.assertEqual(len(db(db.tt).select(cache=(cache, 100),
+                                                  cacheable=True)), 1)
+            self.assertEqual(db(db.tt).count(cache=(cache, 100)), 1)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (4, 2))
+        self.assertTrue(stats['bytes'] > 0)
+        drop(db.tt)
+
+
+class TestCacheOnDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def testBounds(self):
+        # the order of the evictions is the one of the file times
+        ticks = itertools.count(1)
+        clock = lambda: next(ticks)
+        cache = CacheOnDisk(self.folder, max_entries=4, clock=clock)
+        for k in range(4):
+            self.assertEqual(cache(str(k), lambda: k), k)
+        self.assertEqual(cache('0', lambda: None), 0)
+        # down to 90% of the bounds
+        self.assertEqual(cache('4', lambda: 4), 4)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual([str(k) in cache for k in range(5)],
+                         [True, False, False, True, True])
+        cache('3', None)
+        self.assertNotIn('3', cache)
+        self.assertEqual(len(cache), 2)
+        cache.clear('^4$')
+        self.assertEqual(len(cache), 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        cache.close()
+        value = 'x' * 1000
+        cache = CacheOnDisk(self.folder, max_bytes=2500, clock=clock)
+        cache('a', lambda: value)
+        cache('b', lambda: value)
+        cache('c', lambda: value)
+        self.assertEqual(['a' in cache, len(cache)], [False, 2])
+        self.assertEqual(len(cache.entries()), 2)
+        cache('d', lambda: value * 3)
+        self.assertNotIn('d', cache)
+        cache.close()
+
+    def testCorrupt(self):
+        cache = CacheOnDisk(self.folder)
+        stream = open(cache.filename('a'), 'wb')
+        stream.write(b'\x80\x02garbage')
+        stream.close()
+        self.assertEqual(cache('a', lambda: 1), 1)
+        self.assertEqual(cache('a', lambda: 2), 1)
+        cache.close()
+
+    def testExpiration(self):
+        cache = CacheOnDisk(self.folder)
+        self.assertEqual(cache('a', lambda: 1, 100), 1)
+        self.assertEqual(cache('a', lambda: 2, 100), 1)
+        self.assertEqual(cache('a', lambda: 3, None), 1)
+        self.assertEqual(cache('a', lambda: 4, -1), 4)
+        cache.close()
+
+    def testSelect(self):
+        cache = CacheOnDisk(self.folder)
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'))
+        db.tt.insert(aa='1')
+        for k in range(3):
+            rows = db(db.tt).select(cache=(cache, 100), cacheable=True)
+            self.assertEqual(rows[0].aa, '1')
+            self.assertEqual(db(db.tt).count(cache=(cache, 100)), 1)
+        self.assertEqual(len(cache), 2)
+        drop(db.tt)
+        cache.close()
+
+    def testProcesses(self):
+        process = multiprocessing.Process(target=store_in_process,
+                                          args=(self.folder,))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        cache = CacheOnDisk(self.folder)
+        self.assertEqual(cache('key', lambda: os.getpid(), None), process.pid)
+        cache.close()
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_threads(self, cache, time_expire, value, wait_others=False,
+                    n=5):
+        """
+        Calls `cache` from `n` threads: the others start while the first
+        computes `value` (if it has to), which it returns when they are done
+        with `wait_others`, otherwise once they are started
+        """
+        calls, results = [], []
+        entered, release = threading.Event(), threading.Event()
+        def compute():
+            calls.append(True)
+            entered.set()
+            release.wait()
+            return value
+        def call():
+            results.append(cache('key', compute, time_expire))
+        def call_first():
+            try:
+                call()
+            finally:
+                entered.set()
+        first = threading.Thread(target=call_first)
+        first.start()
+        entered.wait()
+        others = [threading.Thread(target=call) for k in range(n - 1)]
+        for thread in others:
+            thread.start()
+        if wait_others:
+            for thread in others:
+                thread.join()
+        release.set()
+        for thread in [first] + others:
+            thread.join()
+        return len(calls), sorted(results)
+
+    def testRun(self):
+        now = [0]
+        cache = SingleFlight(CacheInRam(), clock=lambda: now[0])
+        self.assertEqual(self.run_threads(cache, 100, 1), (1, [1] * 5))
+        self.assertEqual(self.run_threads(cache, 100, 2), (0, [1] * 5))
+        self.assertEqual(cache('key', lambda: 2, None), 1)
+        # expired, the others wait for the new value
+        now[0] = 200
+        self.assertEqual(self.run_threads(cache, 100, 2), (1, [2] * 5))
+        self.assertEqual(cache('key', lambda: 3, -1), 3)
+        cache('key', None)
+        self.assertEqual(cache('key', lambda: 4, 100), 4)
+        self.assertRaises(ZeroDivisionError, cache, 'x', lambda: 1 / 0)
+        # the model is probed (again before computing) and stored into once
+        cache = SingleFlight(CacheInRam())
+        self.assertEqual(cache('key', lambda: 1), 1)
+        self.assertEqual(cache('key', lambda: 2), 1)
+        stats = cache.model.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']),
+                         (1, 2, 1))
+
+    def testLateFlight(self):
+        now = [0]
+        probed, resume = threading.Event(), threading.Event()
+        class PausedFlight(SingleFlight):
+            def flight(self, key, f, expired=None):
+                if threading.current_thread().name == 'late':
+                    probed.set()
+                    resume.wait()
+                return SingleFlight.flight(self, key, f, expired)
+        cache = PausedFlight(CacheInRam(), clock=lambda: now[0])
+        self.assertEqual(cache('key', lambda: 1, 100), 1)
+        now[0] = 200
+        calls, results = [], []
+        def compute():
+            calls.append(True)
+            return 2
+        late = threading.Thread(
+            target=lambda: results.append(cache('key', compute, 100)),
+            name='late')
+        late.start()
+        probed.wait()
+        # the flight ends between the probe of `late` and its own flight
+        self.assertEqual(cache('key', compute, 100), 2)
+        resume.set()
+        late.join()
+        self.assertEqual((len(calls), results), (1, [2]))
+
+    def testStale(self):
+        now = [0]
+        cache = SingleFlight(CacheInRam(), stale=True, clock=lambda: now[0])
+        self.assertEqual(self.run_threads(cache, 100, 1), (1, [1] * 5))
+        now[0] = 200
+        # the others return the stale value while the first computes
+        self.assertEqual(self.run_threads(cache, 100, 2, wait_others=True),
+                         (1, [1, 1, 1, 1, 2]))
+        self.assertEqual(cache('key', lambda: 3, 100), 2)
+
+    def testSelect(self):
+        cache = SingleFlight(CacheInRam())
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'))
+        db.tt.insert(aa='1')
+        for k in range(3):
+            rows = db(db.tt).select(cache=(cache, 100), cacheable=True)
+            self.assertEqual(rows[0].aa, '1')
+            rows = db(db.tt).select(cache=(cache, 100))
+            self.assertEqual(rows[0].aa, '1')
+            self.assertEqual(db(db.tt).count(cache=(cache, 100)), 1)
+        self.assertEqual(cache.model.stats()['entries'], 3)
+        drop(db.tt)
+
+
+@unittest.skipUnless(IS_SQLITE, "uses a sqlite file shared by processes")
+class TestFileTableVersions(unittest.TestCase):
+
+    def testProcesses(self):
+        folder = tempfile.mkdtemp()
+        versions = FileTableVersions(os.path.join(folder, 'versions'))
+        try:
+            cache = CacheInRam()
+            db = DAL('sqlite://storage.sqlite', folder=folder,
+                     adapter_args={'table_versions': versions})
+            db.executesql('CREATE TABLE tt(id INTEGER PRIMARY KEY, aa TEXT);')
+            db.define_table('tt', Field('aa'), migrate=False)
+            db.tt.insert(aa='1')
+            db.commit()
+            select = lambda: len(db(db.tt).select(cache=(cache, 1000),
+                                                  cacheable=True))
+            self.assertEqual(select(), 1)
+            self.assertEqual(select(), 1)
+            process = multiprocessing.Process(target=insert_in_process,
+                                              args=(folder,))
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+            self.assertEqual(select(), 2)
+            self.assertEqual(cache.stats()['misses'], 2)
+            db.close()
+        finally:
+            versions.close()
+            shutil.rmtree(folder)
@@ -7,12 +7,16 @@ from __future__ import print_function
 import sys
 import os
 import glob
+import pickle
 import datetime
+import json
 
 from pydal._compat import PY2, basestring, StringIO, integer_types
+from pydal._load import numpy
 from pydal import DAL, Field
 from pydal.helpers.classes import SQLALL
-from pydal.objects import Table
+from pydal.helpers.cache import RowCounters
+from pydal.objects import Table, LazySet, Row, Expression
 from ._compat import unittest
 from ._adapt import DEFAULT_URI, IS_POSTGRESQL, IS_SQLITE
 
@@ -911,6 +915,154 @@ class TestClientLevelOps(unittest.TestCase):
         db.commit()
         db.close()
 
+    def testIndexBy(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'))
+        for aa, bb in (('x', 1), ('y', 2), ('x', 3), ('z', 4)):
+            db.tt.insert(aa=aa, bb=bb)
+        rows = db(db.tt).select(orderby=db.tt.id)
+        index = rows.index_by(db.tt.aa)
+        self.assertEqual(index.lookup('x').bb, 1)
+        self.assertEqual(index.lookup('w', 0), 0)
+        self.assertEqual([r.bb for r in index['x']], [1, 3])
+        self.assertEqual(len(index['w']), 0)
+        self.assertEqual((len(index), 'y' in index), (3, True))
+        self.assertTrue(rows.index_by(db.tt.aa) is index)
+        self.assertEqual(rows.lookup(2).aa, 'y')
+        self.assertEqual(rows.lookup(('x', 3), by=[db.tt.aa, 'bb']).id, 3)
+        removed = rows.exclude(lambda row: row.aa == 'x')
+        self.assertEqual([r.bb for r in removed], [1, 3])
+        self.assertEqual([r.bb for r in rows], [2, 4])
+        self.assertFalse(rows.index_by(db.tt.aa) is index)
+        self.assertEqual(rows.lookup(1), None)
+        # a snapshot: the changes made directly to the rows need a rebuild
+        self.assertEqual(rows.lookup(2, by='tt.bb').aa, 'y')
+        rows[0].bb = 5
+        self.assertEqual(rows.lookup(5, by='tt.bb'), None)
+        self.assertEqual(rows.index_by('tt.bb', rebuild=True).lookup(5).aa,
+                         'y')
+        self.assertEqual(rows.lookup(5, by='tt.bb').aa, 'y')
+        rows = db(db.tt).select(db.tt.aa, db.tt.bb.sum(), groupby=db.tt.aa)
+        self.assertEqual(rows.index_by('tt.aa').lookup('x')[db.tt.bb.sum()], 4)
+        db.tt.drop()
+        db.close()
+
+    def testSetOperations(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'list:string'))
+        for aa in 'abcd':
+            db.tt.insert(aa=aa, bb=[aa])
+        for fields in ([], [db.tt.aa, db.tt.bb]):
+            rows1 = db(db.tt.id <= 3).select(*fields, orderby=db.tt.id)
+            rows2 = db(db.tt.id >= 2).select(*fields, orderby=db.tt.id)
+            self.assertEqual([r.aa for r in rows1 | rows2], list('abcd'))
+            self.assertEqual([r.aa for r in rows1.union(rows2)], list('abcd'))
+            self.assertEqual([r.aa for r in rows1 - rows2], ['a'])
+            self.assertEqual([r.aa for r in rows2.difference(rows1)], ['d'])
+            self.assertEqual([r.aa for r in rows1.intersection(rows2)],
+                             ['b', 'c'])
+            self.assertEqual(len(rows1 & rows2), 6)
+        rows1 = db(db.tt.id <= 3).select(db.tt.aa, db.tt.id.count(),
+                                         groupby=db.tt.aa)
+        rows2 = db(db.tt.id >= 2).select(db.tt.aa, db.tt.id.count(),
+                                         groupby=db.tt.aa)
+        self.assertEqual(len(rows1 | rows2), 4)
+        self.assertEqual(len(rows1.intersection(rows2)), 2)
+        self.assertRaises(Exception, rows1.__sub__, db(db.tt).select())
+        db.tt.drop()
+        db.close()
+
+    def testSelectJsonCsv(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'),
+                        Field('cc', 'date'), Field('dd', 'list:string'))
+        db.define_table('tu', Field('tt_id', 'reference tt'))
+        for i in range(5):
+            db.tt.insert(aa='x%d' % i, bb=i, cc=datetime.date(2015, 1, i + 1),
+                         dd=['a', 'b'])
+        db.tt.insert(aa=None)
+        db.tu.insert(tt_id=1)
+        for (query, fields) in [(db.tt, []),
+                                (db.tt.id == db.tu.tt_id, []),
+                                (db.tt, [db.tt.aa, db.tt.bb.max()])]:
+            kwargs = {'groupby': db.tt.aa} if fields else {}
+            rows = db(query).select(*fields, **kwargs)
+            data = b''.join(db(query).select_json(*fields, fetch_size=2,
+                                                  **kwargs))
+            self.assertEqual(json.loads(data.decode('utf8')),
+                             json.loads(rows.as_json()))
+            expected = StringIO()
+            rows.export_to_csv_file(expected)
+            ofile = StringIO()
+            db(query).select_csv(*fields, ofile=ofile, fetch_size=2, **kwargs)
+            self.assertEqual(ofile.getvalue(), expected.getvalue())
+        self.assertRaises(SyntaxError, db.tt._db._adapter.select_chunks,
+                          db.tt.id > 0, [db.tt.id], {}, format='xml')
+        self.assertRaises(SyntaxError, db(db.tt).select, compact=False)
+        # the cursor is released by the streams stopped early
+        closed = []
+        db._adapter.close_iter_cursor = closed.append
+        chunks = db(db.tt).select_json(fetch_size=2)
+        self.assertEqual(next(chunks), b'[')
+        next(chunks)
+        chunks.close()
+        self.assertEqual(len(closed), 1)
+        del db._adapter.close_iter_cursor
+        db.tu.drop()
+        db.tt.drop()
+        db.close()
+
+    def testRender(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('person', Field('name'), format='%(name)s')
+        db.define_table('pet', Field('name'),
+                        Field('master', 'reference person'),
+                        Field('friends', 'list:reference person'),
+                        Field('breed', represent=lambda v, r: v + r.name))
+        for k in range(3):
+            db.person.insert(name='p%d' % k)
+        for k in range(6):
+            db.pet.insert(name=str(k), master=k % 3 + 1, friends=[1, 2],
+                          breed='cat')
+        calls = []
+        def represent(field, value, row):
+            calls.append(field.name)
+            return field.represent(value, row)
+        db.representers = {'rows_render': represent}
+        rows = db(db.pet).select(orderby=db.pet.id)
+        executed = []
+        execute = db._adapter.execute
+        def counting(*args, **kwargs):
+            executed.append(args)
+            return execute(*args, **kwargs)
+        db._adapter.execute = counting
+        rendered = list(rows.render())
+        del db._adapter.execute
+        self.assertEqual(len(executed), 2)
+        self.assertEqual([r.master for r in rendered],
+                         ['p0', 'p1', 'p2', 'p0', 'p1', 'p2'])
+        self.assertEqual(rendered[0].friends, 'p0, p1')
+        self.assertEqual(rendered[4].breed, 'cat4')
+        self.assertEqual(rows[4].breed, 'cat')
+        self.assertEqual(rows[4].master, 2)
+        self.assertEqual(calls.count('master'), 3)
+        self.assertEqual(calls.count('breed'), 6)
+        self.assertEqual(rows.render(1, fields=[db.pet.master]).breed, 'cat')
+        # the ids of the referenced records are fetched in batches
+        db._adapter.belongs_size = 2
+        db._adapter.execute = counting
+        rendered = list(rows.render(fields=[db.pet.master]))
+        del db._adapter.execute
+        del db._adapter.belongs_size
+        self.assertEqual(len(executed), 4)
+        self.assertEqual([r.master for r in rendered],
+                         ['p0', 'p1', 'p2', 'p0', 'p1', 'p2'])
+        rows = db(db.pet.master == db.person.id).select(orderby=db.pet.id)
+        self.assertEqual(rows.render(5).pet.master, 'p2')
+        db.pet.drop()
+        db.person.drop()
+        db.close()
+
 
 class TestVirtualFields(unittest.TestCase):
 
@@ -1024,6 +1176,25 @@ class TestImportExportFields(unittest.TestCase):
         db.commit()
         db.close()
 
+    def testBatches(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('person', Field('name'))
+        for k in range(10):
+            db.person.insert(name=str(k))
+        db(db.person.id == 4).delete()
+        stream = StringIO()
+        db.export_to_csv_file(stream)
+        for step in (1, 3, 9, 20):
+            batched = StringIO()
+            db.export_to_csv_file(batched, max_fetch_rows=step)
+            self.assertEqual(batched.getvalue(), stream.getvalue())
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[:2], ['TABLE person', 'person.id,person.name'])
+        self.assertEqual(len(lines), 14)
+        db.person.drop()
+        db.commit()
+        db.close()
+
 
 class TestImportExportUuidFields(unittest.TestCase):
 
@@ -2161,6 +2332,565 @@ class TestIterselect(unittest.TestCase):
         db.close()
         return
 
+    def testFetchSize(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        t0 = db.define_table('t0', Field('name'))
+        names = ['n%s' % i for i in range(7)]
+        for n in names:
+            t0.insert(name=n)
+        for fetch_size in (1, 2, 3, 10):
+            rows = db(db.t0).iterselect(orderby=db.t0.id,
+                                        fetch_size=fetch_size)
+            self.assertEqual(rows.fetch_size, fetch_size)
+            self.assertEqual([r.name for r in rows], names)
+            # skipping rows across batches
+            rows = db(db.t0).iterselect(orderby=db.t0.id,
+                                        fetch_size=fetch_size)
+            self.assertEqual(rows[1].name, names[1])
+            self.assertEqual(rows[5].name, names[5])
+            self.assertEqual(rows[6].name, names[6])
+            self.assertRaises(StopIteration, next, rows)
+            rows = db(db.t0).iterselect(orderby=db.t0.id,
+                                        fetch_size=fetch_size)
+            self.assertRaises(IndexError, rows.__getitem__, 7)
+        rows = db(db.t0).iterselect()
+        self.assertEqual(rows.fetch_size, db._adapter.fetch_size)
+        self.assertRaises(SyntaxError, db(db.t0).select, fetch_size=2)
+        t0.drop()
+        db.close()
+
+    def testClose(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        t0 = db.define_table('t0', Field('name'))
+        for i in range(3):
+            t0.insert(name='n%s' % i)
+        closed = []
+        db._adapter.close_iter_cursor = closed.append
+        # loops stopping early, or dropping the rows, release the cursor
+        rows = db(db.t0).iterselect(fetch_size=1)
+        for row in rows:
+            break
+        self.assertEqual((len(closed), rows.cursor), (1, None))
+        rows = db(db.t0).iterselect(fetch_size=1)
+        self.assertEqual(rows.first().name, 'n0')
+        del rows
+        self.assertEqual(len(closed), 2)
+        del db._adapter.close_iter_cursor
+        t0.drop()
+        db.close()
+
+
+class TestRowParser(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'integer',
+                                                 filter_out=lambda v: v * 2))
+        db.tt.cc = Field.Virtual('cc', lambda row: row.tt.bb + 1)
+        for i in range(3):
+            db.tt.insert(aa='x%s' % i, bb=i)
+        for i in range(3):
+            rows = db(db.tt.bb >= i).select(
+                db.tt.id, db.tt.aa, db.tt.bb, db.tt.bb.sum().with_alias('s'),
+                groupby=db.tt.id|db.tt.aa|db.tt.bb, orderby=db.tt.bb)
+            self.assertEqual([r.tt.bb for r in rows],
+                             [2 * j for j in range(i, 3)])
+            self.assertEqual(rows[0].tt.cc, 2 * i + 1)
+            self.assertEqual(rows[0].s, i)
+            self.assertEqual(rows[0].tt.update_record(aa='y').aa, 'y')
+        self.assertEqual(len(db._adapter._row_parsers), 1)
+        db.tt.drop()
+        # the same colnames for a table defined again with new types
+        db.define_table('tt', Field('aa', 'integer'), Field('bb'))
+        db.tt.insert(aa=1, bb='1')
+        row = db(db.tt).select(db.tt.id, db.tt.aa, db.tt.bb).first()
+        self.assertEqual((row.aa, row.bb), (1, '1'))
+        db.tt.drop()
+        db.close()
+
+    def testNativeTypes(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa', 'integer'), Field('bb', 'date'),
+                        Field('cc', 'datetime'), Field('dd', 'time'))
+        now = datetime.datetime(2015, 1, 2, 3, 4, 5)
+        db.tt.insert(aa=1, bb=now.date(), cc=now, dd=now.time())
+        fields = [db.tt.aa, db.tt.bb, db.tt.cc, db.tt.dd, db.tt.cc.max()]
+        row = db(db.tt).select(*fields).first()
+        self.assertEqual((row.tt.aa, row.tt.bb, row.tt.cc, row.tt.dd,
+                          row[db.tt.cc.max()]),
+                         (1, now.date(), now, now.time(), now))
+        adapter = db._adapter
+        tmps = adapter._parse_expand_colnames(adapter._colnames)[2]
+        parsers = adapter.column_parsers(fields, tmps)
+        for j, field in enumerate(fields[:4]):
+            self.assertEqual(parsers[j] is None,
+                             field.type in adapter.native_types and
+                             not field.type in adapter.long_types)
+        self.assertEqual(type(row.tt.aa), long)
+        self.assertTrue(parsers[4] is not None)
+        db.tt.drop()
+        db.close()
+
+
+class TestLazyRow(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'))
+        db.define_table('tu', Field('tt_id', 'reference tt'), Field('bb'))
+        id = db.tt.insert(aa='x')
+        db.tu.insert(tt_id=id, bb='y')
+        row = db(db.tt).select().first()
+        for name in ('update_record', 'delete_record', 'tu'):
+            self.assertFalse(name in row.__dict__)
+            self.assertTrue(name in row)
+        # the keys of a Row, in the same order
+        keys = list(row.keys())
+        self.assertEqual(sorted(keys),
+                         ['aa', 'delete_record', 'id', 'tu', 'update_record'])
+        self.assertEqual(list(row), keys)
+        self.assertEqual(row['tu'].select().first().bb, 'y')
+        self.assertEqual(list(row.keys()), keys)
+        self.assertTrue('tu' in row.__dict__)
+        self.assertFalse('update_record' in row.__dict__)
+        self.assertEqual(row.as_dict(), Row(row).as_dict())
+        self.assertEqual(row.update_record(aa='z').aa, 'z')
+        self.assertEqual(db.tt[id].aa, 'z')
+        self.assertEqual([key for (key, value) in row.items()], keys)
+        self.assertEqual(list(Row(row).keys()), keys)
+        self.assertEqual(list(row.keys()), keys)
+        self.assertTrue('tu' in row.as_dict(custom_types=LazySet))
+        self.assertEqual(pickle.loads(pickle.dumps(row)).aa, 'z')
+        row = db(db.tu.tt_id == db.tt.id).select().first()
+        self.assertEqual(row.tt.tu.count(), 1)
+        row.tu.delete_record()
+        self.assertTrue(db(db.tu).isempty())
+        db.tu.drop()
+        db.tt.drop()
+        db.close()
+
+
+class TestIdentityMap(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('person', Field('name'))
+        db.define_table('post', Field('title'),
+                        Field('author', 'reference person'))
+        for k in range(2):
+            db.person.insert(name='p%d' % k)
+        for k in range(6):
+            db.post.insert(title=str(k), author=k % 2 + 1)
+        executed = []
+        execute = db._adapter.execute
+        def counting(*args, **kwargs):
+            executed.append(args)
+            return execute(*args, **kwargs)
+        db._adapter.execute = counting
+        with db.identity_map() as identity_map:
+            with db.identity_map() as inner:
+                self.assertIs(inner, identity_map)
+            self.assertIs(db.identity_map(), identity_map)
+            rows = db(db.post).select(orderby=db.post.id)
+            self.assertEqual([row.author.name for row in rows],
+                             ['p0', 'p1'] * 3)
+            self.assertEqual(len(executed), 3)
+            self.assertIs(db.person[1], db.person(1))
+            self.assertEqual(db.person(1, name='p1'), None)
+            self.assertEqual(len(executed), 3)
+            db(db.person.id == 1).update(name='q0')
+            self.assertEqual(db.person[1].name, 'q0')
+            self.assertEqual(len(executed), 5)
+        self.assertEqual(db._identity_map, None)
+        count = len(executed)
+        db.person[2]
+        db.person[2]
+        self.assertEqual(len(executed), count + 2)
+        # a block doesn't disable a map enabled before it
+        identity_map = db.identity_map()
+        db.person[2]
+        with db.identity_map():
+            db.person[2]
+        self.assertIs(db._identity_map, identity_map)
+        db.person[2]
+        self.assertEqual(len(executed), count + 3)
+        del db._adapter.execute
+        db.post.drop()
+        db.person.drop()
+        db.close()
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('person', Field('name'))
+        db.define_table('post', Field('title'),
+                        Field('author', 'reference person'),
+                        Field('editor', 'reference person'))
+        for k in range(5):
+            db.person.insert(name='p%d' % k)
+        for k in range(10):
+            db.post.insert(title=str(k), author=k % 5 + 1,
+                           editor=None if k % 2 else 1)
+        executed = []
+        execute = db._adapter.execute
+        def counting(*args, **kwargs):
+            executed.append(args)
+            return execute(*args, **kwargs)
+        db._adapter.execute = counting
+        db._adapter.belongs_size = 2
+        rows = db(db.post).select(orderby=db.post.id,
+                                  prefetch=[db.post.author, db.post.editor])
+        self.assertEqual(len(executed), 4)
+        self.assertEqual([row.author.name for row in rows],
+                         ['p%d' % (k % 5) for k in range(10)])
+        self.assertEqual([row.editor and row.editor.name for row in rows],
+                         ['p0', None] * 5)
+        self.assertEqual(len(executed), 4)
+        rows = db(db.post.author == db.person.id).select(
+            orderby=db.post.id, prefetch=[db.post.editor])
+        self.assertEqual(rows[0].post.editor.name, 'p0')
+        self.assertEqual(len(executed), 6)
+        del db._adapter.execute
+        del db._adapter.belongs_size
+        db.post.drop()
+        db.person.drop()
+        db.close()
+
+    @unittest.skipUnless(IS_SQLITE, "needs references to missing records")
+    def testIdentityMap(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'],
+                 adapter_args=dict(foreign_keys=False))
+        db.define_table('person', Field('name'))
+        db.define_table('post', Field('author', 'reference person'))
+        db.person.insert(name='p0')
+        for author in (1, 2, 2):
+            db.post.insert(author=author)
+        executed = []
+        execute = db._adapter.execute
+        def counting(*args, **kwargs):
+            executed.append(args)
+            return execute(*args, **kwargs)
+        db._adapter.execute = counting
+        with db.identity_map():
+            rows = db(db.post).select(orderby=db.post.id,
+                                      prefetch=[db.post.author])
+            self.assertEqual(len(executed), 2)
+            # the misses are remembered too
+            self.assertEqual(rows[0].author.name, 'p0')
+            for row in list(rows)[1:]:
+                self.assertRaises(RuntimeError, getattr, row.author, 'name')
+                self.assertEqual(db.person[row.author], None)
+            self.assertEqual(len(executed), 2)
+            rows = db(db.post).select(prefetch=[db.post.author])
+            self.assertEqual(len(executed), 3)
+        del db._adapter.execute
+        db.post.drop()
+        db.person.drop()
+        db.close()
+
+    def testInclude(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('post', Field('title'))
+        db.define_table('reply', Field('body'),
+                        Field('post', 'reference post'))
+        for k in range(4):
+            db.post.insert(title=str(k))
+        for k in range(10):
+            db.reply.insert(body=str(k), post=k % 3 + 1)
+        executed = []
+        execute = db._adapter.execute
+        def counting(*args, **kwargs):
+            executed.append(args)
+            return execute(*args, **kwargs)
+        db._adapter.execute = counting
+        rows = db(db.post).select(orderby=db.post.id,
+                                  include=[db.reply.post])
+        self.assertEqual(len(executed), 2)
+        self.assertEqual([[c.body for c in row.reply.select()]
+                          for row in rows],
+                         [['0', '3', '6', '9'], ['1', '4', '7'],
+                          ['2', '5', '8'], []])
+        self.assertEqual([row.reply.count() for row in rows], [4, 3, 3, 0])
+        self.assertTrue(rows[3].reply.isempty())
+        self.assertEqual(len(executed), 2)
+        self.assertEqual(len(rows[0].reply.select(db.reply.id)), 4)
+        self.assertEqual(len(executed), 3)
+        rows = db(db.post).select(orderby=db.post.id, cacheable=True,
+                                  include=[db.reply.post])
+        self.assertEqual(rows[1].reply.count(), 3)
+        self.assertEqual(len(executed), 5)
+        del db._adapter.execute
+        # writes through the set drop the loaded records
+        rows = db(db.post).select(orderby=db.post.id,
+                                  include=[db.reply.post])
+        rows[0].reply.update(body='x')
+        self.assertEqual([c.body for c in rows[0].reply.select()],
+                         ['x'] * 4)
+        rows[1].reply.delete()
+        self.assertEqual(rows[1].reply.count(), 0)
+        self.assertTrue(rows[1].reply.isempty())
+        self.assertEqual(len(rows[1].reply.select()), 0)
+        db.reply.drop()
+        db.post.drop()
+        db.close()
+
+
+class TestApproximateCount(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa', 'integer'))
+        db._adapter.row_counters = RowCounters()
+        db.tt.bulk_insert([dict(aa=k) for k in range(5)])
+        db.commit()
+        executed = []
+        execute = db._adapter.execute
+        def counting(*args, **kwargs):
+            executed.append(args)
+            return execute(*args, **kwargs)
+        db._adapter.execute = counting
+        self.assertEqual(db(db.tt).count(approximate=True), 5)
+        queries = len(executed)
+        db.tt.insert(aa=5)
+        db.tt.bulk_insert([dict(aa=6), dict(aa=7)])
+        db(db.tt.aa < 2).delete()
+        executed[:] = []
+        self.assertEqual(db(db.tt).count(approximate=True), 6)
+        self.assertEqual(len(executed), 0)
+        self.assertEqual(db(db.tt.aa > 5).count(approximate=True), 2)
+        self.assertEqual(len(executed), 1)
+        db.rollback()
+        self.assertEqual(db(db.tt).count(approximate=True), 5)
+        self.assertEqual(len(executed), 1 + queries)
+        if IS_SQLITE:
+            db.executesql('ANALYZE;')
+            db.tt.insert(aa=5)
+            db._adapter.row_counters_expire = 0
+            self.assertEqual(db(db.tt).count(approximate=True), 5)
+            self.assertEqual(db(db.tt).count(), 6)
+            del db._adapter.row_counters_expire
+        del db._adapter.execute
+        del db._adapter.row_counters
+        db.tt.drop()
+        db.close()
+
+
+class TestColumnarRows(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'),
+                        Field('cc', 'date'))
+        for i in range(5):
+            db.tt.insert(aa='x%s' % i, bb=i, cc=datetime.date(2015, 1, i + 1))
+        rows = db(db.tt).select(orderby=db.tt.id)
+        crows = db(db.tt).select(orderby=db.tt.id, rows_class='columnar')
+        self.assertEqual(len(crows), 5)
+        self.assertEqual(crows.column(db.tt.bb), list(range(5)))
+        self.assertEqual(crows.column(), [1, 2, 3, 4, 5])
+        self.assertEqual(crows.first().aa, 'x0')
+        self.assertEqual(crows.last().cc, datetime.date(2015, 1, 5))
+        self.assertEqual(crows._records.count(None), 3)
+        self.assertEqual(crows[-2].bb, 3)
+        self.assertEqual(len(crows[1:3]), 2)
+        self.assertEqual(crows[1:3][0].aa, 'x1')
+        self.assertEqual(crows.as_list(), rows.as_list())
+        self.assertEqual(crows[2].update_record(aa='y').aa, 'y')
+        self.assertRaises(IndexError, crows.__getitem__, 5)
+        # records turns it into a plain Rows
+        self.assertEqual(len(crows.find(lambda row: row.bb > 2)), 2)
+        self.assertEqual(crows.columns, None)
+        self.assertEqual(len(crows), 5)
+        crows = db(db.tt.bb < 0).select(rows_class='columnar')
+        self.assertEqual((len(crows), crows.first(), bool(crows)),
+                         (0, None, False))
+        self.assertRaises(SyntaxError, db(db.tt).select, rows_class='x')
+        db.tt.drop()
+        db.close()
+
+
+@unittest.skipIf(numpy is None, "numpy not installed")
+class TestNumpyArrays(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'),
+                        Field('cc', 'double'), Field('dd', 'boolean'),
+                        Field('ee', 'datetime'))
+        now = datetime.datetime(2015, 1, 2, 3, 4, 5)
+        for i in range(3):
+            db.tt.insert(aa='x%s' % i, bb=i, cc=i / 2.0, dd=i == 1, ee=now)
+        arrays = db(db.tt).select_arrays(orderby=db.tt.id)
+        self.assertEqual(list(arrays.keys()), db(db.tt).select().colnames)
+        self.assertEqual(
+            [str(a.dtype) for a in arrays.values()],
+            ['int64', 'object', 'int64', 'float64', 'bool', 'datetime64[us]'])
+        self.assertEqual(arrays['tt.bb'].tolist(), [0, 1, 2])
+        self.assertEqual(arrays['tt.dd'].tolist(), [False, True, False])
+        self.assertEqual(arrays['tt.ee'][0], numpy.datetime64(now))
+        db.tt.insert(aa=None)
+        array = db(db.tt).select_arrays(db.tt.bb, db.tt.cc, structured=True,
+                                        orderby=db.tt.id)
+        self.assertEqual(array.dtype.names, ('tt.bb', 'tt.cc'))
+        self.assertEqual(array['tt.bb'].tolist(), [0, 1, 2, None])
+        self.assertTrue(numpy.isnan(array['tt.cc'][3]))
+        rows = db(db.tt).select(db.tt.aa, db.tt.bb.sum(), groupby=db.tt.aa)
+        arrays = rows.as_numpy()
+        self.assertEqual(arrays['tt.aa'].tolist(), [None, 'x0', 'x1', 'x2'])
+        rows = db(db.tt).select(db.tt.bb.sum(), db.tt.cc.max(), groupby=db.tt.dd)
+        arrays = db(db.tt).select_arrays(db.tt.bb.sum(), db.tt.cc.max(),
+                                         groupby=db.tt.dd)
+        self.assertEqual([str(a.dtype) for a in rows.as_numpy().values()],
+                         [str(a.dtype) for a in arrays.values()])
+        db.tt.drop()
+        db.close()
+
+
+class TestCompactRows(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'])
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'),
+                        Field('cc', 'date'))
+        db.tt.dd = Field.Virtual('dd', lambda row: row.tt.bb * 2)
+        for i in range(3):
+            db.tt.insert(aa='x%s' % i, bb=i, cc=datetime.date(2015, 1, i + 1))
+        rows = db(db.tt).select(orderby=db.tt.id)
+        crows = db(db.tt).select(orderby=db.tt.id, rows_class='compact')
+        self.assertEqual(crows.as_list(), rows.as_list())
+        row = crows[1]
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertEqual((row.aa, row['bb'], row[db.tt.cc], row.dd),
+                         ('x1', 1, datetime.date(2015, 1, 2), 2))
+        self.assertEqual(sorted(row.keys()),
+                         sorted(key for key in rows[1].keys() if not key in
+                                ('update_record', 'delete_record')))
+        self.assertTrue('aa' in row)
+        self.assertEqual(row.get('ee', 'x'), 'x')
+        self.assertRaises(AttributeError, getattr, row, 'ee')
+        self.assertEqual(row, rows[1])
+        self.assertEqual(row.as_row().as_dict(), row.as_dict())
+        self.assertEqual(pickle.loads(pickle.dumps(crows[0])).aa, 'x0')
+        crows = db(db.tt).select(db.tt.aa, db.tt.bb.sum(),
+                                 db.tt.bb.max().with_alias('m'),
+                                 groupby=db.tt.aa, orderby=db.tt.aa,
+                                 rows_class='compact')
+        row = crows.first()
+        self.assertEqual((row.tt.aa, row['tt.aa'], row.m), ('x0', 'x0', 0))
+        self.assertEqual(row._extra[db.tt.bb.sum()], 0)
+        self.assertEqual(str(crows), str(db(db.tt).select(
+            db.tt.aa, db.tt.bb.sum(), db.tt.bb.max().with_alias('m'),
+            groupby=db.tt.aa, orderby=db.tt.aa)))
+        db.tt.drop()
+        db.close()
+
+
+class TestBindParams(unittest.TestCase):
+
+    def testRun(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'], param_style='bind')
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'),
+                        Field('cc', 'date'), Field('dd', 'boolean'))
+        self.assertEqual(db.tt.insert(aa="it's", bb=1,
+                                      cc=datetime.date(2015, 6, 1),
+                                      dd=True), 1)
+        if IS_SQLITE:
+            self.assertTrue('?' in db._lastsql)
+            self.assertFalse("it's" in db._lastsql)
+        self.assertEqual(db.tt.insert(aa='a%bc', bb=2, dd=False), 2)
+        self.assertEqual(db.tt.insert(aa='ahbc'.replace('h', '\\'), bb=3), 3)
+        row = db(db.tt.aa == "it's").select().first()
+        self.assertEqual(row.bb, 1)
+        self.assertEqual(row.cc, datetime.date(2015, 6, 1))
+        self.assertEqual(row.dd, True)
+        self.assertEqual(db(db.tt.bb > 1).count(), 2)
+        self.assertEqual(db(db.tt.bb.belongs([1, 3])).count(), 2)
+        self.assertEqual(db(db.tt.aa.like('a_bc')).count(), 2)
+        self.assertEqual(db(db.tt.aa.contains('%')).count(), 1)
+        self.assertEqual(db(db.tt.aa.contains('\\')).count(), 1)
+        self.assertEqual(db(db.tt.aa.upper().like("IT'%")).count(), 1)
+        self.assertEqual(db(db.tt.aa.lower() == "it's").count(), 1)
+        nested = db(db.tt.bb < 3)._select(db.tt.id)
+        self.assertEqual(db(db.tt.id.belongs(nested)).count(), 2)
+        self.assertEqual(db(db.tt.bb == 2).update(aa='x?y'), 1)
+        self.assertEqual(db(db.tt.aa == 'x?y').count(), 1)
+        self.assertEqual(db(db.tt.cc == None).count(), 2)
+        # inline and bound statements give the same answers
+        query = (db.tt.bb >= 2) & (db.tt.aa != 'z')
+        bound = db(query).select(orderby=db.tt.id).as_list()
+        db._adapter.param_style = 'inline'
+        self.assertEqual(db(query).select(orderby=db.tt.id).as_list(), bound)
+        db._adapter.param_style = 'bind'
+        self.assertEqual(db(db.tt.bb > 1).delete(), 2)
+        self.assertEqual(db(db.tt).count(), 1)
+        self.assertRaises(SyntaxError, DAL, DEFAULT_URI, param_style='foo')
+        # the owner of the bound values is restored when an operator fails
+        failing = Expression(db, lambda first: 1 / 0, db.tt.aa)
+        self.assertRaises(ZeroDivisionError, db._adapter.expand,
+                          failing == 'x')
+        self.assertTrue(db._adapter._bind_owner is None)
+        db.tt.drop()
+        db.close()
+
+    def testSelectCache(self):
+        db = DAL(DEFAULT_URI, check_reserved=['all'], param_style='bind')
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'))
+        for i in range(5):
+            db.tt.insert(aa='x%s' % i, bb=i)
+        adapter = db._adapter
+        for i in range(5):
+            rows = db((db.tt.bb >= i) & (db.tt.aa != 'x4')).select(
+                orderby=db.tt.bb)
+            self.assertEqual([r.bb for r in rows], list(range(i, 4)))
+            self.assertEqual(db(db.tt.bb.belongs((i, i + 1))).count(), 2 - i // 4)
+            rows = db(db.tt.bb.belongs((i, 4 - i))).select(db.tt.aa)
+            self.assertEqual(len(rows), 1 if i == 2 else 2)
+            self.assertEqual(rows.colnames, ['tt.aa'])
+        self.assertEqual(len(adapter._select_templates), 3)
+        # literals inlined in the SQL are part of the key
+        rows = db(db.tt.bb == None).select()
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(len(db(db.tt.id > 0).select(limitby=(0, 2))), 2)
+        self.assertEqual(len(db(db.tt.id > 0).select(limitby=(0, 3))), 3)
+        self.assertEqual(len(adapter._select_templates), 6)
+        # rewritten literals are not cached
+        self.assertEqual(len(db(db.tt.aa.startswith('x')).select()), 5)
+        self.assertEqual(len(adapter._select_templates), 6)
+        db.tt.insert(aa='xhy'.replace('h', '\\'))
+        self.assertEqual(len(db(db.tt.aa.like('x%')).select()), 6)
+        self.assertEqual(db(db.tt.aa.like('xhy'.replace('h', '\\'))).select(
+            db.tt.aa).column(), ['xhy'.replace('h', '\\')])
+        self.assertEqual(len(adapter._select_templates), 6)
+        adapter.select_cache_size = 2
+        for i in range(3):
+            db(db.tt.bb == i).select(limitby=(0, i + 1))
+        self.assertEqual(len(adapter._select_templates), 2)
+        db.tt.drop()
+        db.close()
+
+    def testPreparedStatements(self):
+        if not IS_POSTGRESQL: return
+        db = DAL(DEFAULT_URI, check_reserved=['all'], param_style='bind',
+                 adapter_args=dict(prepared_statements=2))
+        db.define_table('tt', Field('aa'), Field('bb', 'integer'))
+        for i in range(5):
+            db.tt.insert(aa='x%%%s' % i, bb=i)
+        for i in range(5):
+            rows = db(db.tt.bb >= i).select(orderby=db.tt.bb)
+            self.assertEqual([r.aa for r in rows],
+                             ['x%%%s' % j for j in range(i, 5)])
+        self.assertTrue(db._lastsql.startswith('EXECUTE'))
+        self.assertEqual(db(db.tt.bb < 3).update(aa='y'), 3)
+        self.assertEqual(db(db.tt.bb < 2).update(aa='z'), 2)
+        self.assertEqual(db(db.tt.bb < 1).update(aa='w'), 1)
+        self.assertEqual(db(db.tt.aa == 'y').count(), 1)
+        registry = db._adapter.PREPARED[db._adapter.connection]
+        self.assertEqual(len(registry.names), 2)
+        db.tt.drop()
+        db.close()
+
 if __name__ == '__main__':
     unittest.main()
     tearDownModule()